@@ -4,13 +4,36 @@ import os
 
 import numpy as np
 
-from crazycar.agents.constants import N_DISTANCE_SENSORS, CAMERA_WIDTH, CAMERA_HEIGHT
-from crazycar.utils import rgba2rgb, rgb2gray, timing
+from crazycar.agents.constants import (
+    N_DISTANCE_SENSORS, SENSOR_RANGE, SENSOR_FOV,
+    GOAL_REGION, CAR_SIZE,
+    CAMERA_WIDTH, CAMERA_HEIGHT,
+)
+from crazycar.utils import rgba2gray, timing
 
 
 MODULE_PATH = os.path.dirname(os.path.abspath(crazycar.__file__))
 
 
+def sensor_angles(n_rays=len(N_DISTANCE_SENSORS), fov=SENSOR_FOV):
+    """
+    Angles of the distance sensors, `N_DISTANCE_SENSORS` with the default arguments
+
+    Args:
+        n_rays: number of rays
+        fov: field of view (Degrees), the rays go all around the car from 360
+
+    Returns:
+        list of angles in Degrees
+    """
+
+    if fov >= 360:
+        return np.linspace(-180, 180, n_rays, endpoint=False).tolist()
+    if n_rays == 1:
+        return [0.]
+    return np.linspace(-fov / 2, fov / 2, n_rays).tolist()
+
+
 class BaseAgent:
     """
     The Racecar
@@ -22,14 +45,27 @@ class BaseAgent:
         plane_id: plane for put the car to
         direction_field: define the direction
         wall_ids: which id is wall
+        debug: draw the sensor rays (only visible with a GUI)
+        render_cache: `RenderCache` shared by the cars for the camera frames (no cache if None)
+        n_rays: number of distance sensors
+        sensor_range: length of the distance sensors
+        sensor_fov: field of view of the distance sensors (Degrees)
     """
 
-    def __init__(self, bullet_client, origin, carpos, plane_id, direction_field, wall_ids):
+    # shape of each observation key for a single car (without batch axis), with the default distance sensors
+    observation_shapes = {}
+
+    def __init__(self, bullet_client, origin, carpos, plane_id, direction_field, wall_ids, debug=False,
+                 render_cache=None, n_rays=len(N_DISTANCE_SENSORS), sensor_range=SENSOR_RANGE, sensor_fov=SENSOR_FOV):
         self._p = bullet_client
+        self.debug = debug
+        self.render_cache = render_cache
+        self.others_visible = False  # another car is in the frame of the camera, the frame can not be cached
         self._origin = origin
         self._carpos = carpos
         self._direction_field = direction_field
-        self._dist_sensors = N_DISTANCE_SENSORS
+        self._dist_sensors = sensor_angles(n_rays, sensor_fov)
+        self.observation_shapes = self.get_observation_shapes(n_rays)
         self.speed = 0
         self.rayHitColor = [1, 0, 0]
         self.rayMissColor = [0, 1, 0]
@@ -37,7 +73,7 @@ class BaseAgent:
         self.plane_id = plane_id
         self.rayFrom = []
         self.rayTo = []
-        self.rayRange = math.pi / 3
+        self.rayRange = sensor_range
         self.steeringLinks = [0, 2]
         self.maxForce = 1000
         self.motorizedwheels = [8, 15]
@@ -46,6 +82,12 @@ class BaseAgent:
         self.atGoal = False
         self.nCollision = 0
         self.wall_ids = wall_ids
+        self.pose_cache = True
+        self._coordinate = None
+        self._wall_set = set(wall_ids)
+        self.collision = None  # collision of the current step, None if not checked yet
+        self.sensor_values = None  # sensor of the current step from another backend, None if not set
+        self.camera_values = None  # camera of the current step from another backend, None if not set
         self.initial()
 
     @timing('initial_car', debug=False)
@@ -59,9 +101,8 @@ class BaseAgent:
         z = self._origin[2] + 0.03
 
         scale = 0.41
-        carsize = 0.205
         carx = x + self._carpos[0]
-        cary = y + self._carpos[1] - carsize / 2
+        cary = y + self._carpos[1] - CAR_SIZE / 2
         carStartOrientation = self._p.getQuaternionFromEuler([0, 0, self._carpos[2]])
         car = self._p.loadURDF(
             os.path.join(MODULE_PATH, "data/racecar/racecar_differential1.urdf"),
@@ -71,9 +112,17 @@ class BaseAgent:
             useFixedBase=False
         )
         self.racecarUniqueId = car
+        # pose of the base (centre of mass frame) as spawned, `loadURDF` takes the origin of the URDF instead
+        self._start_position, self._start_orientation = self._p.getBasePositionAndOrientation(car)
+        self._n_joints = self._p.getNumJoints(car)
+
+        # position of the laser (link 4) and the camera (link 5) in the frame of the car
+        self.sensor_offset = self._link_offset(4)
+        self.sensor_height = self._p.getLinkState(self.racecarUniqueId, 4)[0][2]
+        self.camera_offset = self._link_offset(5)
 
         # setup wheels
-        for wheel in range(self._p.getNumJoints(car)):
+        for wheel in range(self._n_joints):
             self._p.setJointMotorControl2(car, wheel, self._p.VELOCITY_CONTROL, targetVelocity=0, force=0)
             self._p.getJointInfo(car, wheel)
 
@@ -113,14 +162,95 @@ class BaseAgent:
         for degree in self._dist_sensors:
             from_ = [0, 0, 0]
             to_ = [np.cos(math.radians(degree)) * self.rayRange, np.sin(math.radians(degree)) * self.rayRange, 0]
-            self._sensor.append(
-                self._p.addUserDebugLine(from_, to_, self.rayHitColor,
-                                         parentObjectUniqueId=car, parentLinkIndex=4))
             self.rayFrom.append(from_)
             self.rayTo.append(to_)
+        self.sensor_rays = np.array(self.rayTo)[:, :2]  # end of each ray in the frame of the sensor
         # print(self.rayTo)
         # _ = self.getSensor()
 
+        if self.debug:
+            self.add_sensor()
+
+    @classmethod
+    def get_observation_shapes(cls, n_rays=len(N_DISTANCE_SENSORS)):
+        """
+        Shape of each observation key for a number of distance sensors
+
+        Args:
+            n_rays: number of distance sensors
+
+        Returns:
+            dictionary of shape
+        """
+
+        shapes = dict(cls.observation_shapes)
+        if "sensor" in shapes:
+            shapes["sensor"] = (n_rays + 1, )
+        return shapes
+
+    def _link_offset(self, link):
+        """
+        Position of a link in the frame of the base of the car, at the start
+
+        Args:
+            link: index of the link
+
+        Returns:
+            array [x, y]
+        """
+
+        basePos, _ = self._p.getBasePositionAndOrientation(self.racecarUniqueId)
+        linkPos = self._p.getLinkState(self.racecarUniqueId, link)[0]
+        dx, dy = linkPos[0] - basePos[0], linkPos[1] - basePos[1]
+        yaw = self._carpos[2]
+
+        return np.array([np.cos(yaw) * dx + np.sin(yaw) * dy, -np.sin(yaw) * dx + np.cos(yaw) * dy])
+
+    def reset_state(self):
+        """
+        Reset the tracking variables of the car
+        """
+
+        self.speed = 0
+        self.atGoal = False
+        self.nCollision = 0
+        self.clear_cache()
+
+    def clear_cache(self):
+        """
+        Invalidate the kinematic state of the car, must be called after every simulation step
+        """
+
+        self._coordinate = None
+        self.collision = None
+        self.sensor_values = None
+        self.camera_values = None
+
+    def respawn(self):
+        """
+        Move the car back to the start without reloading the body and its constraints
+        """
+
+        car = self.racecarUniqueId
+        self._p.resetBasePositionAndOrientation(car, self._start_position, self._start_orientation)
+        self._p.resetBaseVelocity(car, [0, 0, 0], [0, 0, 0])
+
+        for joint in range(self._n_joints):
+            self._p.resetJointState(car, joint, targetValue=0, targetVelocity=0)
+            self._p.setJointMotorControl2(car, joint, self._p.VELOCITY_CONTROL, targetVelocity=0, force=0)
+
+        self.reset_state()
+
+    def add_sensor(self):
+        """
+        Add debug lines for car sensor
+        """
+
+        for from_, to_ in zip(self.rayFrom, self.rayTo):
+            self._sensor.append(
+                self._p.addUserDebugLine(from_, to_, self.rayHitColor,
+                                         parentObjectUniqueId=self.racecarUniqueId, parentLinkIndex=4))
+
     def remove_sensor(self):
         """
         Remove car sensor
@@ -138,13 +268,53 @@ class BaseAgent:
             x, y, angle (Radians)
         """
 
+        if self.pose_cache and self._coordinate is not None:
+            return self._coordinate
+
         carpos, carorn = self._p.getBasePositionAndOrientation(self.racecarUniqueId)
 
         posEuler = self._p.getEulerFromQuaternion(carorn)
 
         yaw = posEuler[2]
 
-        return carpos[0], carpos[1], yaw
+        self._coordinate = carpos[0], carpos[1], yaw
+        return self._coordinate
+
+    def get_link_pose(self, offset):
+        """
+        Get pose of a point fixed to the car
+
+        Args:
+            offset: position of the point in the frame of the car [x, y]
+
+        Returns:
+            x, y, angle (Radians)
+        """
+
+        x, y, yaw = self.get_coordinate()
+        dx, dy = offset
+
+        return x + np.cos(yaw) * dx - np.sin(yaw) * dy, y + np.sin(yaw) * dx + np.cos(yaw) * dy, yaw
+
+    def get_sensor_pose(self):
+        """
+        Get pose of the laser
+
+        Returns:
+            x, y, angle (Radians)
+        """
+
+        return self.get_link_pose(self.sensor_offset)
+
+    def get_camera_pose(self):
+        """
+        Get pose of the camera
+
+        Returns:
+            x, y, angle (Radians)
+        """
+
+        return self.get_link_pose(self.camera_offset)
 
     def get_angle_field(self):
         """
@@ -156,13 +326,7 @@ class BaseAgent:
 
         x, y, yaw = self.get_coordinate()
 
-        angles = []
-        for field in self._direction_field:
-            a = field(x, y)
-            if a:
-                angles.append(float(a))
-
-        return angles[0]
+        return float(self._direction_field.lookup(x, y))
 
     def get_diff_angle(self):
         """
@@ -175,10 +339,9 @@ class BaseAgent:
         angleField = self.get_angle_field()
         _, _, yaw = self.get_coordinate()
         # diff = abs((-np.radians(angleField) - yaw)) if yaw <= 0 else abs((np.radians(angleField) - yaw))
-        try:
-            diff = np.abs(np.radians(angleField) - yaw)
-        except:
-            diff = .0
+        if np.isnan(angleField):  # outside of the direction field
+            return .0
+        diff = np.abs(np.radians(angleField) - yaw)
         # TODO: fix bug angle
         # print(angleField, np.degrees(yaw), np.degrees(diff), )
         return diff
@@ -191,10 +354,18 @@ class BaseAgent:
             list of each sensors
         """
 
-        obs = []
+        if self.sensor_values is not None:
+            return self.sensor_values
 
         results = self._p.rayTestBatch(self.rayFrom, self.rayTo, 0, parentObjectUniqueId=self.racecarUniqueId,
                                        parentLinkIndex=4)
+
+        if not self.debug:
+            # every ray starts at the sensor and is `rayRange` long,
+            # so the normalized distance is the hit fraction itself
+            return np.array([obj[2] for obj in results])
+
+        obs = []
         for i, obj in enumerate(results):
             hitObjectUid = obj[0]
             hitFraction = obj[2]
@@ -219,21 +390,21 @@ class BaseAgent:
 
         return np.array(obs) / self.rayRange
 
-    @timing('process_camera', debug=False)
-    def get_camera(self):
+    def get_camera_rgba(self, out=None):
         """
-        Get camera image
+        Get the raw camera image from Bullet, without the segmentation mask
+
+        Args:
+            out: array shape(CAMERA_HEIGHT, CAMERA_WIDTH, 4) uint8 to write into (new array if None)
 
         Returns:
-            image from front camera
+            rgba image
         """
 
         ls = self._p.getLinkState(self.racecarUniqueId, 5, computeForwardKinematics=True)
         camPos = ls[0]
         camOrn = ls[1]
-        camOrn = list(camOrn)
         # TODO: add back camera
-        camOrn = tuple(camOrn)
         camMat = self._p.getMatrixFromQuaternion(camOrn)
         forwardVec = [camMat[0], camMat[3], camMat[6]]
         camUpVec = [camMat[2], camMat[5], camMat[8]]
@@ -249,17 +420,54 @@ class BaseAgent:
         # raw = np.array(raw).reshape((CAMERA_HEIGHT, CAMERA_WIDTH, 1))
         # raw = np.where(np.isin(raw, self.wall_ids), 1, np.where(raw > max(self.wall_ids), 4, raw))  # segment wall and another car
 
-        # gray image from rgba image
         raw = self._p.getCameraImage(CAMERA_WIDTH, CAMERA_HEIGHT, viewMatrix=viewMat, projectionMatrix=projMat,
-                                     renderer=self._p.ER_BULLET_HARDWARE_OPENGL)[2]
-        raw = np.array(raw).reshape((CAMERA_HEIGHT, CAMERA_WIDTH, 4))
+                                     renderer=self._p.ER_BULLET_HARDWARE_OPENGL,
+                                     flags=self._p.ER_NO_SEGMENTATION_MASK)[2]
+
+        # a numpy array when Bullet is built with numpy, a flat list otherwise
+        raw = np.asarray(raw, dtype=np.uint8).reshape((CAMERA_HEIGHT, CAMERA_WIDTH, 4))
+        if out is None:
+            return raw
+        np.copyto(out, raw)
+        return out
+
+    def get_cached_camera(self):
+        """
+        Get the camera image from the render cache
 
-        raw = rgba2rgb(raw)
-        # np.save('./test1.npy', raw)
-        raw = np.expand_dims(rgb2gray(raw), -1)
-        # np.save('./test2.npy', raw)
+        Returns:
+            key of the frame (None if the cache can not be used), frame (None if not cached)
+        """
 
-        return np.array([raw])
+        if self.render_cache is None or self.others_visible:
+            return None, None
+
+        key = self.render_cache.key(self.get_camera_pose())
+        return key, self.render_cache.get(key)
+
+    @timing('process_camera', debug=False)
+    def get_camera(self):
+        """
+        Get camera image
+
+        Returns:
+            gray image from front camera shape(1, CAMERA_HEIGHT, CAMERA_WIDTH, 1) float32
+        """
+
+        if self.camera_values is not None:
+            return self.camera_values
+
+        key, frame = self.get_cached_camera()
+        if frame is not None:
+            return frame
+
+        frame = np.empty((1, CAMERA_HEIGHT, CAMERA_WIDTH, 1), dtype=np.float32)
+        rgba2gray(self.get_camera_rgba(), out=frame[0, :, :, 0])
+
+        if key is not None:
+            frame = self.render_cache.put(key, frame)
+
+        return frame
 
     def _is_collision(self, part_id):
         """
@@ -284,13 +492,24 @@ class BaseAgent:
         except:
             return False
 
-    def is_collision(self):
+    def is_collision_aabb(self):
         """
-        Check this car is collision
+        Check this car is collision with the AABB of each part (slow)
         """
 
         return any([self._is_collision(i) for i in range(1, 10)])
 
+    def is_collision(self):
+        """
+        Check this car is collision, from the contact points with the walls
+        """
+
+        if self.collision is None:
+            contacts = self._p.getContactPoints(bodyA=self.racecarUniqueId)
+            self.collision = any([contact[2] in self._wall_set for contact in contacts])
+
+        return self.collision
+
     def apply_action(self, commands):
         """
         Apply action to car
@@ -309,17 +528,27 @@ class BaseAgent:
             steeringAngle = commands[1] * self.steeringMultiplier
 
         self.speed = targetVelocity / self.speedMultiplier
-
-        for motor in self.motorizedwheels:
-            self._p.setJointMotorControl2(self.racecarUniqueId, motor, self._p.VELOCITY_CONTROL,
-                                          targetVelocity=targetVelocity, force=self.maxForce)
-        for steer in self.steeringLinks:
-            self._p.setJointMotorControl2(self.racecarUniqueId, steer, self._p.POSITION_CONTROL,
-                                          targetPosition=steeringAngle)
+        self.apply_motor(targetVelocity, steeringAngle)
 
         # update
         x, y, _ = self.get_coordinate()
-        self.atGoal |= 2.1 <= x <= 2.9 and 0.9 <= y <= 1
+        (x_min, y_min), (x_max, y_max) = GOAL_REGION
+        self.atGoal |= x_min <= x <= x_max and y_min <= y <= y_max
+
+    def apply_motor(self, targetVelocity, steeringAngle):
+        """
+        Set the motors of the car, one call for the wheels and one call for the steering
+
+        Args:
+            targetVelocity: velocity of the motorized wheels
+            steeringAngle: angle of the steering links (Radians)
+        """
+
+        self._p.setJointMotorControlArray(self.racecarUniqueId, self.motorizedwheels, self._p.VELOCITY_CONTROL,
+                                          targetVelocities=[float(targetVelocity)] * len(self.motorizedwheels),
+                                          forces=[self.maxForce] * len(self.motorizedwheels))
+        self._p.setJointMotorControlArray(self.racecarUniqueId, self.steeringLinks, self._p.POSITION_CONTROL,
+                                          targetPositions=[float(steeringAngle)] * len(self.steeringLinks))
 
     def get_info(self):
         """
@@ -356,3 +585,15 @@ class BaseAgent:
         """
 
         return NotImplementedError
+
+    def write_observation(self, buffers, index):
+        """
+        Write observation of car in place
+
+        Args:
+            buffers: dictionary of array shape(n_cars, ...) for each key
+            index: row of this car
+        """
+
+        for key, value in self.get_observation().items():
+            buffers[key][index] = value[0]
@@ -1,5 +1,19 @@
+import math
+
+
 N_DISTANCE_SENSORS = [-90, -60, -30, 0, 30, 60, 90]
 
+# size of the car, the spawn position is offset by half of it
+CAR_SIZE = 0.205
+
+SENSOR_RANGE = math.pi / 3
+
+# field of view of the distance sensors (Degrees), the rays are spread evenly from one side to the other
+SENSOR_FOV = 180
+
+# [x_min, y_min], [x_max, y_max] of the goal region
+GOAL_REGION = ((2.1, 0.9), (2.9, 1))
+
 CAMERA_HEIGHT = 20
 
 CAMERA_WIDTH = 20
@@ -2,9 +2,15 @@ import numpy as np
 import math
 
 from crazycar.agents import BaseAgent
+from crazycar.agents.constants import SENSOR_SHAPE, CAMERA_SHAPE
 
 
 class Racecar(BaseAgent):
+    observation_shapes = {
+        "image": CAMERA_SHAPE,
+        "sensor": SENSOR_SHAPE
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -21,6 +27,12 @@ class Racecar(BaseAgent):
         }
         return observation
 
+    def write_observation(self, buffers, index):
+        buffers["image"][index] = self.get_camera()[0]
+        sensor = buffers["sensor"][index]
+        sensor[:-1] = self.get_sensor()
+        sensor[-1] = self.speed
+
     def get_reward(self):
         # diff_angle = self.get_diff_angle()
 
@@ -2,9 +2,14 @@ import numpy as np
 import math
 
 from crazycar.agents import BaseAgent
+from crazycar.agents.constants import CAMERA_SHAPE
 
 
 class ImageAgent(BaseAgent):
+    observation_shapes = {
+        "image": CAMERA_SHAPE
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -14,6 +19,9 @@ class ImageAgent(BaseAgent):
         }
         return observation
 
+    def write_observation(self, buffers, index):
+        buffers["image"][index] = self.get_camera()[0]
+
     def get_reward(self):
         # diff_angle = self.get_diff_angle()
 
@@ -2,9 +2,14 @@ import numpy as np
 import math
 
 from crazycar.agents import BaseAgent
+from crazycar.agents.constants import SENSOR_SHAPE
 
 
 class SensorAgent(BaseAgent):
+    observation_shapes = {
+        "sensor": SENSOR_SHAPE
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -20,6 +25,11 @@ class SensorAgent(BaseAgent):
         }
         return observation
 
+    def write_observation(self, buffers, index):
+        sensor = buffers["sensor"][index]
+        sensor[:-1] = self.get_sensor()
+        sensor[-1] = self.speed
+
     def get_reward(self):
         # diff_angle = self.get_diff_angle()
 
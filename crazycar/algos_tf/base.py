@@ -2,7 +2,7 @@ import tensorflow as tf
 import numpy as np
 import sonnet as snt
 
-from crazycar.algos_tf.common import Replay
+from crazycar.algos_tf.common import Replay, PrioritizedReplay
 from crazycar.agents.constants import SENSOR_SHAPE, CAMERA_SHAPE
 
 
@@ -17,7 +17,7 @@ class BaseNetwork(snt.Module):
     # @tf.function
     def initialize_input(self):
         tmp = {
-            "sensor": tf.ones((1, ) + SENSOR_SHAPE),
+            "sensor": tf.ones((1, ) + getattr(self.enc, "sensor_shape", SENSOR_SHAPE)),
             "image": tf.ones((1, ) + CAMERA_SHAPE)
         }
 
@@ -52,9 +52,10 @@ class BaseModel(snt.Module):
     Base class for Actor-Critic algorithm
     """
 
-    def __init__(self, replay_size=int(1e5), name=None):
+    def __init__(self, replay_size=int(1e5), name=None, prioritized=False):
         super().__init__(name=name)
-        self.rb = Replay(replay_size)
+        self.prioritized = prioritized
+        self.rb = PrioritizedReplay(replay_size) if prioritized else Replay(replay_size)
 
     def write_metric(self, metric, step):
         raise NotImplementedError
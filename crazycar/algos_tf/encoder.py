@@ -3,14 +3,20 @@ import sonnet as snt
 
 from tensorflow.keras import layers, activations
 
+from crazycar.agents.constants import SENSOR_SHAPE
+
 
 class Sensor(snt.Module):
     """
     For sensor feature with 256 feature
+
+    Args:
+        sensor_shape: shape of the sensor observation (number of distance sensors + 1, )
     """
 
-    def __init__(self, name="sensor"):
+    def __init__(self, sensor_shape=SENSOR_SHAPE, name="sensor"):
         super().__init__(name=name)
+        self.sensor_shape = tuple(sensor_shape)
         self.encode = snt.Sequential([
             layers.Dense(256, activation=activations.tanh)
         ])
@@ -39,10 +45,14 @@ class Image(snt.Module):
 class Combine(snt.Module):
     """
     Use all feature with 512 feature
+
+    Args:
+        sensor_shape: shape of the sensor observation (number of distance sensors + 1, )
     """
 
-    def __init__(self, name="combine"):
+    def __init__(self, sensor_shape=SENSOR_SHAPE, name="combine"):
         super().__init__(name=name)
+        self.sensor_shape = tuple(sensor_shape)
         self.image_reps = ImpalaCNN()
         self.sensor_reps = snt.Sequential([
             layers.Dense(256, activation=activations.tanh),
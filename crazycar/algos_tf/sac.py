@@ -109,9 +109,10 @@ class SAC(BaseModel):
                  tau=0.05,
                  replay_size=int(1e6),
                  hiddens=[256, 256],
+                 prioritized=False,
                  name="SAC"):
 
-        super().__init__(replay_size, name=name)
+        super().__init__(replay_size, name=name, prioritized=prioritized)
 
         self.tau = tau
         self.gamma = gamma
@@ -176,11 +177,14 @@ class SAC(BaseModel):
     @tf.function
     def critic_loss(self, batch):
         """
-        L(s, a) = (y - Q(s,a))^2
+        L(s, a) = w * (y - Q(s,a))^2
 
         Where,
             Q is a soft-Q: Q - alpha * log_prob
             y(s, a) = r(s, a) + (1 - done) * gamma * Q'(s', a'); a' ~ u'(s')
+            w is the importance weight of prioritized replay (1 otherwise)
+
+        Returns the loss and |y - Q(s, a)| averaged over both critics, the priorities of prioritized replay
         """
 
         q1, q2 = self.critic(batch['obs'], batch['act'])
@@ -191,10 +195,27 @@ class SAC(BaseModel):
             batch['rew'] + (1 - batch['done']) * self.gamma * next_v_target
         )
 
-        td_q1 = tf.reduce_mean((target_q - q1) ** 2)
-        td_q2 = tf.reduce_mean((target_q - q2) ** 2)
+        td1 = target_q - q1
+        td2 = target_q - q2
+
+        weights = batch['weights'] if 'weights' in batch else 1.
+        td_q1 = tf.reduce_mean(weights * td1 ** 2)
+        td_q2 = tf.reduce_mean(weights * td2 ** 2)
+        td_error = tf.stop_gradient((tf.abs(td1) + tf.abs(td2)) / 2)
+
+        return td_q1 + td_q2, td_error
+
+    @tf.function
+    def update_critic(self, batch):
+        with tf.device('/GPU:0' if tf.test.is_gpu_available() else '/CPU:0'):
+            with tf.GradientTape() as tape:
+                loss, td_error = self.critic_loss(batch)
+
+            # Optimize the critic
+            grads = tape.gradient(loss, self.critic.trainable_variables)
+            self.critic_opt.apply(grads, self.critic.trainable_variables)
 
-        return td_q1 + td_q2
+        return loss, td_error
 
     @tf.function
     def alpha_loss(self, batch):
@@ -234,7 +255,12 @@ class SAC(BaseModel):
     def update_params(self, i, batch_size=256):
         batch = self.rb.sample(batch_size)
 
-        critic_loss = self.update_critic(batch)
+        critic_loss, td_error = self.update_critic(batch)
+
+        # priorities from the TD errors of the critic loss, before the update
+        if self.prioritized:
+            self.rb.update_priorities(td_error.numpy())
+
         critic_v_loss = self.update_critic_v(batch)
         actor_loss = self.update_actor(batch)
         alpha_loss = self.update_alpha(batch)
@@ -2,7 +2,7 @@ import torch
 import torch.nn as nn
 import numpy as np
 
-from crazycar.algos_torch.common import Replay
+from crazycar.algos_torch.common import Replay, PrioritizedReplay
 
 
 class BaseNetwork(nn.Module):
@@ -27,9 +27,10 @@ class BaseModel:
     Base class for Actor-Critic algorithm
     """
 
-    def __init__(self, replay_size=int(1e5)):
+    def __init__(self, replay_size=int(1e5), prioritized=False):
         super().__init__()
-        self.rb = Replay(replay_size)
+        self.prioritized = prioritized
+        self.rb = PrioritizedReplay(replay_size) if prioritized else Replay(replay_size)
 
     def write_metric(self, metric, step):
         raise NotImplementedError
@@ -3,7 +3,7 @@ import random
 import numpy as np
 import torch.nn as nn
 
-from collections import deque
+from crazycar.replay import ReplayBuffer, PrioritizedReplayBuffer
 
 
 def initial(seed=100):
@@ -32,87 +32,41 @@ def make_mlp(sizes, activation, output_activation=nn.Identity):
     return nn.Sequential(*layers)
 
 
-class Replay:
+class Replay(ReplayBuffer):
     """
-    Experience replay for RL
+    Experience replay for RL, the sampled batch is converted to tensors
     """
 
-    def __init__(self, maxlen=int(1e6)):
-        self.data = deque(maxlen=maxlen)
+    def __init__(self, maxlen=int(1e6), compress=0):
+        super().__init__(maxlen, compress)
 
-    def store(self, dict_data):
-        """
-        Store data
-
-        Args:
-            dict_data:
-            {
-                "obs": xxx
-                "act": xxx
-                "next_obs": xxx
-                "rew": xxx
-                "done": xxx
-            }
-        """
-
-        self.data.append(dict_data)
-
-    def process(self, data):
+    def process(self, batch):
         """
         Process data
 
         Args:
-            data: list of dictionary
+            batch: dictionary of batch for each, uint8 images and float32 others
 
         Returns:
             dictionary of batch for each
         """
 
-        batch = {
-            "obs": {
-                "image": torch.FloatTensor(
-                    np.concatenate([el["obs"]["image"] for el in data])
-                ).to('cuda') if "image" in data[0]["obs"] else None,
-                "sensor": torch.FloatTensor(
-                    np.concatenate([el["obs"]["sensor"] for el in data])
-                ).to('cuda') if "sensor" in data[0]["obs"] else None
-            },
-            "act": torch.FloatTensor(
-                np.concatenate([np.expand_dims(el["act"], axis=0) for el in data])
-            ).to('cuda'),
-            "next_obs": {
-                "image": torch.FloatTensor(
-                    np.concatenate([el["next_obs"]["image"] for el in data])
-                ).to('cuda') if "image" in data[0]["obs"] else None,
-                "sensor": torch.FloatTensor(
-                    np.concatenate([el["next_obs"]["sensor"] for el in data])
-                ).to('cuda') if "sensor" in data[0]["obs"] else None
-            },
-            "rew": torch.FloatTensor(
-                np.expand_dims(np.concatenate([el["rew"] for el in data]), axis=-1)
-            ).to('cuda'),
-            "done": torch.FloatTensor(
-                np.expand_dims(np.concatenate([el["done"] for el in data]), axis=-1)
-            ).to('cuda')
+        return {
+            key: {sub_key: self.to_tensor(sub_value) for sub_key, sub_value in value.items()}
+            if isinstance(value, dict) else self.to_tensor(value)
+            for key, value in batch.items()
         }
 
-        # clear unwanted key
-        if batch["obs"]["image"] is None:
-            batch["obs"].pop("image")
-        if batch["obs"]["sensor"] is None:
-            batch["obs"].pop("sensor")
-
-        if batch["next_obs"]["image"] is None:
-            batch["next_obs"].pop("image")
-        if batch["next_obs"]["sensor"] is None:
-            batch["next_obs"].pop("sensor")
+    @staticmethod
+    def to_tensor(value):
+        # uint8 images are moved to the device before the conversion to float
+        return torch.from_numpy(np.ascontiguousarray(value)).to('cuda').float()
 
-        return batch
 
-    def sample(self, size=256):
-        idx = list(range(len(self.data)))
-        np.random.shuffle(idx)
-        idx = idx[:size]
-        tmp = np.array(self.data)
-        return self.process(tmp[idx])
+class PrioritizedReplay(PrioritizedReplayBuffer, Replay):
+    """
+    Prioritized experience replay for RL, the sampled batch is converted to tensors
+    """
 
+    def __init__(self, maxlen=int(1e6), compress=0, alpha=0.6, beta=0.4):
+        super().__init__(maxlen, compress, alpha, beta)
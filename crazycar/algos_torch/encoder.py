@@ -10,12 +10,15 @@ from crazycar.agents.constants import SENSOR_SHAPE, CAMERA_HEIGHT, CAMERA_DEPT
 class Sensor(nn.Module):
     """
     For sensor feature with 256 feature
+
+    Args:
+        sensor_dim: size of the sensor observation (number of distance sensors + 1)
     """
 
-    def __init__(self):
+    def __init__(self, sensor_dim=SENSOR_SHAPE[0]):
         super().__init__()
         self.encode = nn.Sequential(
-            nn.Linear(SENSOR_SHAPE[0], 256)
+            nn.Linear(sensor_dim, 256)
         )
 
     def forward(self, obs):
@@ -44,13 +47,16 @@ class Image(nn.Module):
 class Combine(nn.Module):
     """
     Use all feature with 512 feature
+
+    Args:
+        sensor_dim: size of the sensor observation (number of distance sensors + 1)
     """
 
-    def __init__(self):
+    def __init__(self, sensor_dim=SENSOR_SHAPE[0]):
         super().__init__()
         self.image_reps = ImpalaCNN(CAMERA_HEIGHT, CAMERA_DEPT)
         self.sensor_reps = nn.Sequential(
-            nn.Linear(SENSOR_SHAPE[0], 256)
+            nn.Linear(sensor_dim, 256)
         )
 
     def forward(self, obs):
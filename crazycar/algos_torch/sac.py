@@ -92,9 +92,10 @@ class SAC(BaseModel):
                  interval_target=2,
                  tau=0.05,
                  replay_size=int(1e6),
-                 hiddens=[256, 256]):
+                 hiddens=[256, 256],
+                 prioritized=False):
 
-        super().__init__(replay_size=replay_size)
+        super().__init__(replay_size=replay_size, prioritized=prioritized)
 
         self.tau = tau
         self.gamma = gamma
@@ -119,6 +120,9 @@ class SAC(BaseModel):
         self.target_entropy = -torch.Tensor(act_dim).to('cuda')
         self.alpha_opt = Adam([self.log_alpha], lr=lr)
 
+        # |y - Q(s, a)| of the last critic loss averaged over both critics, the priorities of prioritized replay
+        self.td_error = None
+
     def actor_loss(self, batch):
         """
         L(s) = -E[Q(s, a)| a~u(s)]
@@ -154,11 +158,12 @@ class SAC(BaseModel):
 
     def critic_loss(self, batch):
         """
-        L(s, a) = (y - Q(s,a))^2
+        L(s, a) = w * (y - Q(s,a))^2
 
         Where,
             Q is a soft-Q: Q - alpha * log_prob
             y(s, a) = r(s, a) + (1 - done) * gamma * Q'(s', a'); a' ~ u'(s')
+            w is the importance weight of prioritized replay (1 otherwise)
         """
 
         q1, q2 = self.critic(batch['obs'], batch['act'])
@@ -168,8 +173,13 @@ class SAC(BaseModel):
         with torch.no_grad():
             target_q = batch['rew'] + (1 - batch['done']) * self.gamma * next_v_target
 
-        td_q1 = ((target_q - q1) ** 2).mean()
-        td_q2 = ((target_q - q2) ** 2).mean()
+        td1 = target_q - q1
+        td2 = target_q - q2
+        self.td_error = ((torch.abs(td1) + torch.abs(td2)) / 2).detach()
+
+        weights = batch.get('weights', 1.)
+        td_q1 = (weights * td1 ** 2).mean()
+        td_q2 = (weights * td2 ** 2).mean()
 
         return td_q1 + td_q2
 
@@ -187,6 +197,11 @@ class SAC(BaseModel):
         batch = self.rb.sample(batch_size)
 
         critic_loss = self._update(self.critic_opt, self.critic_loss, batch)
+
+        # priorities from the TD errors of the critic loss, before the update
+        if self.prioritized:
+            self.rb.update_priorities(self.td_error.cpu().numpy())
+
         critic_v_loss = self._update(self.critic_v_opt, self.critic_v_loss, batch)
         actor_loss = self._update(self.actor_opt, self.actor_loss, batch)
         alpha_loss = self._update(self.alpha_opt, self.alpha_loss, batch)
@@ -1 +1,3 @@
 from crazycar.environments.environment import Environment
+from crazycar.environments.vec_environment import VecEnvironment
+from crazycar.environments.kinematic import KinematicEnvironment
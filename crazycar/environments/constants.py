@@ -1,5 +1,74 @@
+import os
+
+
 TIMESTEP_SIM = 0.01
 
 ORIGIN = [0, 0, 0]
 
 MAX_STEP = 1000
+
+ACTION_REPEAT = 1
+
+DIRECTION_FIELD_RESOLUTION = 0.01
+
+TRACK_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "crazycar", "tracks")
+
+TRACK_CACHE_VERSION = 2
+
+RESET_MODES = ("rebuild", "snapshot", "respawn")
+
+RENDER_MODES = ("headless", "gui", "record")
+
+OBS_MODES = ("list", "array")
+
+DONE_MODES = ("episode", "car")
+
+# spread spawn of the cars ("car" mode), distance of the base of a car to the walls and to the other cars
+SPAWN_CLEARANCE = 0.2
+SPAWN_SPACING = 0.3
+
+SENSOR_BACKENDS = ("bullet", "analytic")
+
+# the distance sensors of all cars go in rayTestBatch calls of at most this many rays (limit of Bullet)
+RAY_BATCH_SIZE = 8192
+# default threads of rayTestBatch for an `Environment`, 0 for every core (1 for each `VecEnvironment` worker)
+RAY_THREADS = 0
+
+# collision filter groups, cars only collide with the plane and the walls
+# the ray tests use the default group of Bullet, so every mask has to include it
+COLLISION_GROUP_RAY = 1
+COLLISION_GROUP_PLANE = 2
+COLLISION_GROUP_WALL = 4
+COLLISION_GROUP_CAR = 8
+
+# kinematic model of the car, fitted to Bullet with `crazycar.scripts.calibrate_kinematic`
+KINEMATIC_PARAMS = {
+    "speed_gain": 2.28,  # forward speed (m/s) at full throttle
+    "speed_rate": 2.55,  # 1 / time constant of the speed (1/s)
+    "steering_gain": 0.5,  # steering angle (Radians) at full steering
+    "steering_rate": 9.,  # 1 / time constant of the steering (1/s)
+    "wheelbase": 0.131,
+}
+
+# geometry of the car in the frame of its base (Bullet puts the base at the center of mass)
+KINEMATIC_BASE_OFFSET = 0.082  # from the origin of the URDF to the base
+KINEMATIC_SENSOR_OFFSET = (0.02665, 0.)  # from the base to the laser
+KINEMATIC_FOOTPRINT = (-0.1045, 0.0847, 0.0615)  # rear, front, half width
+KINEMATIC_CLEARANCE_RESOLUTION = 0.02
+
+CAMERA_BACKENDS = ("bullet", "software")
+
+# software renderer, fitted to the images of Bullet (TinyRenderer)
+RENDER_FAR = 20.
+RENDER_CAMERA_Z = 0.038  # height of the camera when the car is at rest
+RENDER_LIGHT_DIRECTION = (-0.43, 0.259)  # horizontal part of the light direction
+RENDER_AMBIENT = 0.6
+RENDER_DIFFUSE = 0.35
+RENDER_FLOOR_COLORS = ((239 / 255, 239 / 255, 239 / 255), (162 / 255, 186 / 255, 224 / 255))  # checker of the plane
+RENDER_FLOOR_SQUARE = 0.5
+RENDER_BACKGROUND_COLOR = (1., 1., 1.)
+
+# render cache of the camera frames
+RENDER_CACHE_RESOLUTION = (0.005, 0.01)  # position, angle (Radians)
+RENDER_CACHE_MEMORY = 64 * 1024 ** 2  # bytes
+RENDER_CACHE_VISIBLE_RADIUS = 0.15  # radius of a car, for the check of the other cars in the frame
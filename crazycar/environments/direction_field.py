@@ -0,0 +1,71 @@
+import math
+import numpy as np
+
+from crazycar.environments.constants import DIRECTION_FIELD_RESOLUTION
+
+
+class DirectionField:
+    """
+    Direction to go on the track, compiled into a raster grid of angles for O(1) lookup
+
+    Args:
+        regions: list of [angle (Degrees), x_min, x_max, y_min, y_max],
+            the first region wins where regions overlap
+        resolution: size of a grid cell
+        grid: already compiled grid (e.g. from a cache), painted from the regions if None
+    """
+
+    def __init__(self, regions, resolution=DIRECTION_FIELD_RESOLUTION, grid=None):
+        self.regions = np.array(regions, dtype=np.float64)
+        self.resolution = resolution
+
+        self.x_min = self.regions[:, 1].min()
+        self.y_min = self.regions[:, 3].min()
+
+        if grid is not None:
+            self.grid = np.asarray(grid, dtype=np.float32)
+            return
+
+        nx = int(np.ceil((self.regions[:, 2].max() - self.x_min) / resolution)) + 1
+        ny = int(np.ceil((self.regions[:, 4].max() - self.y_min) / resolution)) + 1
+
+        # center of each cell
+        xs = self.x_min + (np.arange(nx) + 0.5) * resolution
+        ys = self.y_min + (np.arange(ny) + 0.5) * resolution
+
+        # paint in reverse order, so the first region is on top
+        self.grid = np.full((nx, ny), np.nan, dtype=np.float32)
+        for angle, x0, x1, y0, y1 in self.regions[::-1]:
+            mask_x = (x0 <= xs) & (xs <= x1)
+            mask_y = (y0 <= ys) & (ys <= y1)
+            self.grid[np.ix_(mask_x, mask_y)] = angle
+
+    def lookup(self, x, y):
+        """
+        Get the angle of direction to go for one or many positions
+
+        Args:
+            x: x coordinate (scalar or array)
+            y: y coordinate (scalar or array)
+
+        Returns:
+            angle in Degrees (NaN outside of the field), same shape as x
+        """
+
+        nx, ny = self.grid.shape
+
+        # fast path for a single car
+        if np.ndim(x) == 0 and np.ndim(y) == 0:
+            ix = math.floor((x - self.x_min) / self.resolution)
+            iy = math.floor((y - self.y_min) / self.resolution)
+            if 0 <= ix < nx and 0 <= iy < ny:
+                return float(self.grid[ix, iy])
+            return math.nan
+
+        ix = np.floor((np.asarray(x) - self.x_min) / self.resolution).astype(np.int64)
+        iy = np.floor((np.asarray(y) - self.y_min) / self.resolution).astype(np.int64)
+
+        inside = (0 <= ix) & (ix < nx) & (0 <= iy) & (iy < ny)
+        angle = self.grid[np.clip(ix, 0, nx - 1), np.clip(iy, 0, ny - 1)]
+
+        return np.where(inside, angle, np.nan)
@@ -2,11 +2,28 @@ import pybullet
 import crazycar
 import os
 
+import numpy as np
+
+from time import time
 from pybullet_envs.bullet import bullet_client
 
-from crazycar.environments.maps import Map
-from crazycar.environments.constants import TIMESTEP_SIM, ORIGIN, MAX_STEP
-from crazycar.utils import timing, get_observation_shape
+from crazycar.environments.track import Track
+from crazycar.environments.ray_caster import RayCaster, point_segment_distance
+from crazycar.environments.renderer import SoftwareRenderer
+from crazycar.environments.render_cache import RenderCache
+from crazycar.environments.constants import (
+    TIMESTEP_SIM, ORIGIN, MAX_STEP, ACTION_REPEAT,
+    RESET_MODES, RENDER_MODES, OBS_MODES, DONE_MODES, SENSOR_BACKENDS, CAMERA_BACKENDS,
+    RAY_BATCH_SIZE, RAY_THREADS, SPAWN_CLEARANCE, SPAWN_SPACING, KINEMATIC_BASE_OFFSET,
+    RENDER_CACHE_RESOLUTION, RENDER_CACHE_MEMORY, RENDER_CACHE_VISIBLE_RADIUS,
+    COLLISION_GROUP_RAY, COLLISION_GROUP_PLANE, COLLISION_GROUP_WALL, COLLISION_GROUP_CAR,
+)
+from crazycar.agents.constants import (
+    N_DISTANCE_SENSORS, SENSOR_RANGE, SENSOR_FOV,
+    GOAL_REGION, CAR_SIZE,
+    CAMERA_WIDTH, CAMERA_HEIGHT,
+)
+from crazycar.utils import LazyDict, timing, get_observation_shape, rgba2gray, CallCounter
 
 
 MODULE_PATH = os.path.dirname(os.path.abspath(crazycar.__file__))
@@ -15,18 +32,110 @@ MODULE_PATH = os.path.dirname(os.path.abspath(crazycar.__file__))
 class Environment:
     """
     Crazy Car Environment
+
+    Args:
+        map_id: which map to build (id of a track in `data/tracks` or path to a track file)
+        reset_mode: how to reset the environment
+            "rebuild": rebuild the world and reload the cars every episode
+            "snapshot": build once, then restore an in-memory snapshot of the world
+            "respawn": build once, then move the existing cars back to their start
+        render_mode: how to render the environment
+            "headless": no rendering, no debug items (fastest)
+            "gui": open the Bullet GUI and draw the sensor rays
+            "record": same as "gui" and record a video to `record_path`
+        record_path: video file for the "record" mode
+        action_repeat: number of physics steps for each action
+        count_calls: count the Bullet calls of each step (reported in info)
+        sensor_backend: how to compute the distance sensors
+            "bullet": the rays of all cars in one rayTestBatch (one for each car with a GUI to draw them)
+            "analytic": intersect the rays with the wall segments for all cars at once (NumPy)
+        camera_backend: how to render the camera
+            "bullet": one getCameraImage for each car
+            "software": render the cameras of all cars at once from the track (NumPy), without the other cars
+        render_cache: cache the Bullet camera frames on the quantized pose of the camera,
+            skipped for a car when another car is in its frame (metrics reported in info)
+        render_cache_resolution: size of a bin of the pose (position, angle (Radians))
+        render_cache_memory: maximum size of the cached frames in bytes
+        obs_mode: format of the observations
+            "list": list of dictionaries for each car, reward [[r]] for each car and is done [bool]
+            "array": dictionary of float32 arrays shape(n_cars, ...) for each key, reward and is done
+                shape(n_cars, ). The arrays are preallocated and updated in place at every step
+                (copy them to keep them)
+        done_mode: when an episode ends
+            "episode": one episode for every car, done when every car is crashed or after `MAX_STEP` steps
+            "car": each car is an independent episode with its own is done (one for each car), a crashed car
+                or a car after `MAX_STEP` steps is respawned at its start within the step. The cars neither
+                collide with nor are seen by the distance sensors of each other (the Bullet camera still shows
+                them, use the "software" camera backend for independent images). Cars that overlap still cost
+                the broadphase of Bullet at every step, spread their starts with `spawn_positions`
+        auto_reset: reset the environment within `step` when the episode is done ("episode" mode, the cars
+            of the "car" mode are always respawned), the returned observation is the start of the next episode
+            and the last one is in info["terminal_observation"] {car index: observation}
+        n_rays: number of distance sensors of each car (the "sensor" observation has n_rays + 1 values)
+        sensor_range: length of the distance sensors
+        sensor_fov: field of view of the distance sensors (Degrees), all around the car from 360
+        info_keys: keys of the info to return (all if None), e.g. () for an empty info,
+            "terminal_observation" is always returned. The information of the cars is computed when it is
+            read or at the latest at the next step, leave out "cars" to skip it
+        ray_threads: threads of the Bullet ray tests of the distance sensors (0 for every core)
     """
 
-    def __init__(self, map_id=1):
-        self.p = bullet_client.BulletClient(connection_mode=pybullet.DIRECT)
+    def __init__(self, map_id=1, reset_mode="rebuild", render_mode="headless", record_path="./record.mp4",
+                 action_repeat=ACTION_REPEAT, count_calls=False, sensor_backend="bullet",
+                 camera_backend="bullet", render_cache=False, render_cache_resolution=RENDER_CACHE_RESOLUTION,
+                 render_cache_memory=RENDER_CACHE_MEMORY, obs_mode="list",
+                 done_mode="episode", auto_reset=False, n_rays=len(N_DISTANCE_SENSORS), sensor_range=SENSOR_RANGE,
+                 sensor_fov=SENSOR_FOV, info_keys=None, ray_threads=RAY_THREADS):
+        assert reset_mode in RESET_MODES, f"reset_mode must be one of {RESET_MODES}"
+        assert render_mode in RENDER_MODES, f"render_mode must be one of {RENDER_MODES}"
+        assert sensor_backend in SENSOR_BACKENDS, f"sensor_backend must be one of {SENSOR_BACKENDS}"
+        assert camera_backend in CAMERA_BACKENDS, f"camera_backend must be one of {CAMERA_BACKENDS}"
+        assert obs_mode in OBS_MODES, f"obs_mode must be one of {OBS_MODES}"
+        assert done_mode in DONE_MODES, f"done_mode must be one of {DONE_MODES}"
+
+        connection_mode = pybullet.DIRECT if render_mode == "headless" else pybullet.GUI
+        self.p = bullet_client.BulletClient(connection_mode=connection_mode)
+        if render_mode == "record":
+            self.p.startStateLogging(self.p.STATE_LOGGING_VIDEO_MP4, record_path)
+        if count_calls:
+            self.p = CallCounter(self.p)
+
         self.map_id = map_id
+        self.track = Track(map_id)
+        self.sensor_backend = sensor_backend
+        self.n_rays = n_rays
+        self.sensor_range = sensor_range
+        self.sensor_fov = sensor_fov
+        self.ray_threads = ray_threads
+        self.ray_caster = RayCaster(self.track.segments + np.array(ORIGIN[:2]), max_range=sensor_range)
+        self.camera_backend = camera_backend
+        self.renderer = SoftwareRenderer(self.track, ORIGIN)
+        self.render_cache = RenderCache(render_cache_resolution, render_cache_memory) if render_cache else None
+        self._rgba = np.empty((0, CAMERA_HEIGHT, CAMERA_WIDTH, 4), dtype=np.uint8)
+        self._gray = np.empty((0, CAMERA_HEIGHT, CAMERA_WIDTH), dtype=np.float32)
+        self.obs_mode = obs_mode
+        self.obs_buffers = {}
+        self.rew_buffer = np.zeros(0, dtype=np.float32)
+        self.done_buffer = np.zeros(0, dtype=bool)
+        self.done_mode = done_mode
+        self.auto_reset = auto_reset
+        self.info_keys = info_keys
+        self.info = None  # info of the last step
+        self.reset_mode = reset_mode
+        self.render_mode = render_mode
+        self.action_repeat = action_repeat
+        self.snapshot_id = None
+        self.world_ready = False
         self.cars = []
         self.position_cars = []
 
         # variable for tracking
         self.n_collision = 0
         self.step_count = 0
+        self.car_steps = np.zeros(0, dtype=np.int64)  # steps of the episode of each car ("car" mode)
+        self.n_episodes = 0  # finished episodes of the cars ("car" mode)
         self.n_reset = 0
+        self.reset_latency = 0.
 
         # reset
         self._reset()
@@ -44,8 +153,13 @@ class Environment:
         self.plane_id = self.p.loadURDF(os.path.join(MODULE_PATH, "data/plane.urdf"))
 
         # spawn race track
-        m = Map(self.p, ORIGIN)
-        self.direction_field, self.wall_ids = m.map[self.map_id]()
+        self.wall_ids = [self.track.build(self.p, ORIGIN)]
+        self.direction_field = self.track.direction_field
+
+        # setup collision filter
+        self.set_collision_filter(self.plane_id, COLLISION_GROUP_PLANE, COLLISION_GROUP_CAR | COLLISION_GROUP_RAY)
+        for wall_id in self.wall_ids:
+            self.set_collision_filter(wall_id, COLLISION_GROUP_WALL, COLLISION_GROUP_CAR | COLLISION_GROUP_RAY)
 
         # reset common variables
         for i in range(100):
@@ -65,6 +179,19 @@ class Environment:
         for car_obj, pos in self.position_cars:
             self.insert_car(car_obj, pos)
 
+    def set_collision_filter(self, body_id, group, mask):
+        """
+        Set collision filter for every link of the body
+
+        Args:
+            body_id: id of the body
+            group: collision group of the body
+            mask: which groups the body collides with
+        """
+
+        for link in range(-1, self.p.getNumJoints(body_id)):
+            self.p.setCollisionFilterGroupMask(body_id, link, group, mask)
+
     def insert_car(self, car_obj, position):
         """
         Insert the car to position
@@ -80,23 +207,302 @@ class Environment:
                     carpos=position,
                     plane_id=self.plane_id,
                     direction_field=self.direction_field,
-                    wall_ids=self.wall_ids)
+                    wall_ids=self.wall_ids,
+                    debug=self.render_mode != "headless",
+                    render_cache=self.render_cache,
+                    n_rays=self.n_rays,
+                    sensor_range=self.sensor_range,
+                    sensor_fov=self.sensor_fov)
         )
+        # independent cars are not seen by the distance sensors of the others either
+        mask = COLLISION_GROUP_PLANE | COLLISION_GROUP_WALL
+        if self.done_mode == "episode":
+            mask |= COLLISION_GROUP_RAY
+        self.set_collision_filter(self.cars[-1].racecarUniqueId, COLLISION_GROUP_CAR, mask)
+
+        # the world changed, need to rebuild at the next reset
+        self.world_ready = False
 
         if self.n_reset == 1:
             self.position_cars.append([car_obj, position])
 
+    def spawn_positions(self, n_cars, seed=0):
+        """
+        Random starts spread over the track, facing the direction field, with the base of each car
+        at least `SPAWN_CLEARANCE` from the walls and `SPAWN_SPACING` from the other cars
+
+        Args:
+            n_cars: number of positions
+            seed: seed of the random positions
+
+        Returns:
+            list of [x, y, angle (Radians)] for `insert_car`
+        """
+
+        rng = np.random.default_rng(seed)
+        regions = self.direction_field.regions
+        low, high = regions[:, [1, 3]].min(axis=0), regions[:, [2, 4]].max(axis=0)
+
+        bases = np.zeros((0, 2))
+        for _ in range(100):
+            candidates = rng.uniform(low, high, (64 * n_cars, 2))
+            angles = self.direction_field.lookup(candidates[:, 0], candidates[:, 1])
+            clear = point_segment_distance(candidates, self.track.segments).min(axis=1) >= SPAWN_CLEARANCE
+            for base in candidates[clear & ~np.isnan(angles)]:
+                if len(bases) == n_cars:
+                    break
+                if np.all(np.linalg.norm(bases - base, axis=1) >= SPAWN_SPACING):
+                    bases = np.concatenate([bases, [base]])
+            if len(bases) == n_cars:
+                break
+        else:
+            raise ValueError(f"cannot spread {n_cars} cars on the track, only {len(bases)} fit")
+
+        # back from the base to the position of `BaseAgent`, the origin of the URDF
+        angles = np.radians(self.direction_field.lookup(bases[:, 0], bases[:, 1]))
+        x = bases[:, 0] - np.cos(angles) * KINEMATIC_BASE_OFFSET
+        y = bases[:, 1] - np.sin(angles) * KINEMATIC_BASE_OFFSET + CAR_SIZE / 2
+
+        return np.stack([x, y, angles], axis=-1).tolist()
+
     def get_obs(self):
         """
         Get observation of car in environment
 
         Returns:
-            list (observation for each car)
+            list (observation for each car), or dictionary of array shape(n_cars, ...) for the "array" mode
         """
 
+        if self.obs_mode == "array":
+            self.allocate_buffers()
+
+        self.observe(self.cars)
+
+        if self.obs_mode == "array":
+            for i, car in enumerate(self.cars):
+                car.write_observation(self.obs_buffers, i)
+            return self.obs_buffers
+
         res = [car.get_observation() for car in self.cars]
         return res
 
+    def update_obs(self, obs, indices):
+        """
+        Observe some cars again (e.g. after their respawn), the other cars keep their observation
+
+        Args:
+            obs: observation from `get_obs`
+            indices: index of the cars
+
+        Returns:
+            observation with the cars updated (in place for the "array" mode)
+        """
+
+        self.observe([self.cars[i] for i in indices])
+
+        if self.obs_mode == "array":
+            for i in indices:
+                self.cars[i].write_observation(self.obs_buffers, i)
+            return self.obs_buffers
+
+        res = list(obs)
+        for i in indices:
+            res[i] = self.cars[i].get_observation()
+        return res
+
+    def observe(self, cars):
+        """
+        Compute the distance sensors and the cameras of some cars with the backends of the environment
+
+        Args:
+            cars: list of cars
+        """
+
+        if self.sensor_backend == "analytic":
+            self.cast_sensors(cars)
+        elif self.render_mode == "headless":
+            self.test_sensors(cars)
+        if self.camera_backend == "software":
+            self.render_cameras(cars)
+        else:
+            self.capture_cameras(cars)
+
+    def allocate_buffers(self):
+        """
+        Allocate the observation, reward and is done arrays of the "array" mode, once for the inserted cars
+        """
+
+        if len(self.rew_buffer) == len(self.cars):
+            return
+
+        shapes = {}
+        for car in self.cars:
+            shapes.update(car.observation_shapes)
+
+        n_cars = len(self.cars)
+        self.obs_buffers = {key: np.zeros((n_cars, ) + tuple(shape), dtype=np.float32) for key, shape in shapes.items()}
+        self.rew_buffer = np.zeros(n_cars, dtype=np.float32)
+        self.done_buffer = np.zeros(n_cars, dtype=bool)
+
+    def get_sensor_rays(self, cars):
+        """
+        Distance sensors of the cars in the world
+
+        Args:
+            cars: list of cars
+
+        Returns:
+            start shape(n, 2), vector from the start to the end of each ray shape(n, r, 2)
+        """
+
+        poses = np.array([car.get_sensor_pose() for car in cars])
+        rays = np.stack([car.sensor_rays for car in cars])
+
+        # rotate the rays from the frame of the car to the world
+        cos, sin = np.cos(poses[:, 2:]), np.sin(poses[:, 2:])
+        rays = np.stack([cos * rays[..., 0] - sin * rays[..., 1], sin * rays[..., 0] + cos * rays[..., 1]], axis=-1)
+
+        return poses[:, :2], rays
+
+    def cast_sensors(self, cars=None):
+        """
+        Compute the distance sensors of every car with the analytic ray caster
+
+        Args:
+            cars: cars to observe (every car if None)
+        """
+
+        cars = [car for car in (self.cars if cars is None else cars) if "sensor" in car.observation_shapes]
+        if not cars:
+            return
+
+        fractions = self.ray_caster.cast(*self.get_sensor_rays(cars))
+        for car, fraction in zip(cars, fractions):
+            car.sensor_values = fraction
+
+    def test_sensors(self, cars=None):
+        """
+        Compute the distance sensors of every car with Bullet, the rays of all cars go in a single rayTestBatch
+
+        Args:
+            cars: cars to observe (every car if None)
+        """
+
+        cars = [car for car in (self.cars if cars is None else cars) if "sensor" in car.observation_shapes]
+        if not cars:
+            return
+
+        origins, rays = self.get_sensor_rays(cars)
+        heights = np.array([car.sensor_height for car in cars])
+        ray_from = np.empty(rays.shape[:2] + (3, ))
+        ray_from[..., :2] = origins[:, None]
+        ray_from[..., 2] = heights[:, None]
+        ray_to = ray_from.copy()
+        ray_to[..., :2] += rays
+
+        ray_from = ray_from.reshape((-1, 3)).tolist()
+        ray_to = ray_to.reshape((-1, 3)).tolist()
+        fractions = np.empty(len(ray_from))
+        for start in range(0, len(ray_from), RAY_BATCH_SIZE):
+            end = start + RAY_BATCH_SIZE
+            results = self.p.rayTestBatch(ray_from[start:end], ray_to[start:end], numThreads=self.ray_threads)
+            fractions[start:end] = [result[2] for result in results]
+
+        for car, fraction in zip(cars, fractions.reshape(rays.shape[:2])):
+            car.sensor_values = fraction
+
+    def render_cameras(self, cars=None):
+        """
+        Render the camera of every car with the software renderer
+
+        Args:
+            cars: cars to observe (every car if None)
+        """
+
+        cars = [car for car in (self.cars if cars is None else cars) if "image" in car.observation_shapes]
+        if not cars:
+            return
+
+        images = self.renderer.render([car.get_camera_pose() for car in cars])
+        for car, image in zip(cars, images):
+            car.camera_values = image[None, :, :, None]
+
+    def capture_cameras(self, cars=None):
+        """
+        Get the camera of every car from Bullet (or the render cache), the raw images go to a preallocated
+        buffer and are converted to gray in one batch
+
+        Args:
+            cars: cars to observe (every car if None)
+        """
+
+        cars = [car for car in (self.cars if cars is None else cars) if "image" in car.observation_shapes]
+        if not cars:
+            return
+
+        if self.render_cache is not None:
+            self.mark_visible_cars()
+
+        if len(self._rgba) < len(cars):
+            self._rgba = np.empty((len(cars), CAMERA_HEIGHT, CAMERA_WIDTH, 4), dtype=np.uint8)
+            self._gray = np.empty((len(cars), CAMERA_HEIGHT, CAMERA_WIDTH), dtype=np.float32)
+
+        if self.obs_mode == "array" and len(cars) == len(self.cars):
+            # straight into the observation
+            frames = self.obs_buffers["image"][:, None]
+        else:
+            # new array at every step, the observations may be kept (e.g. in a replay buffer)
+            frames = np.empty((len(cars), 1, CAMERA_HEIGHT, CAMERA_WIDTH, 1), dtype=np.float32)
+
+        misses = []
+        for i, car in enumerate(cars):
+            key, frame = car.get_cached_camera()
+            if frame is not None:
+                frames[i] = frame
+            else:
+                car.get_camera_rgba(out=self._rgba[len(misses)])
+                misses.append((i, key))
+
+        if len(misses) == len(cars):
+            rgba2gray(self._rgba[:len(cars)], out=frames[:, 0, :, :, 0])
+        elif misses:
+            rgba2gray(self._rgba[:len(misses)], out=self._gray[:len(misses)])
+            frames[[i for i, _ in misses], 0, :, :, 0] = self._gray[:len(misses)]
+
+        for i, key in misses:
+            if key is not None:
+                self.render_cache.put(key, frames[i])
+
+        for car, frame in zip(cars, frames):
+            car.camera_values = frame
+
+    def mark_visible_cars(self):
+        """
+        Flag the cars with another car in the frame of their camera (field of view of 90 degrees,
+        not hidden behind a wall), their frame can not come from the render cache
+        """
+
+        if len(self.cars) == 1:
+            self.cars[0].others_visible = False
+            return
+
+        cameras = np.array([car.get_camera_pose() for car in self.cars])
+        positions = np.array([car.get_coordinate()[:2] for car in self.cars])
+
+        # position of every car in the frame of every camera, shape(n, n, 2)
+        rel = positions[None] - cameras[:, None, :2]
+        cos, sin = np.cos(cameras[:, 2:]), np.sin(cameras[:, 2:])
+        forward = cos * rel[..., 0] + sin * rel[..., 1]
+        lateral = -sin * rel[..., 0] + cos * rel[..., 1]
+        in_frame = (forward > -RENDER_CACHE_VISIBLE_RADIUS) & (np.abs(lateral) < forward + RENDER_CACHE_VISIBLE_RADIUS)
+        np.fill_diagonal(in_frame, False)
+
+        # hidden if a wall is between the camera and the car
+        hidden = self.renderer.ray_caster.cast(cameras[:, :2], rel) < 1
+
+        for car, visible in zip(self.cars, (in_frame & ~hidden).any(axis=1)):
+            car.others_visible = bool(visible)
+
     def get_reward(self):
         """
         Get reward of car in environment
@@ -113,29 +519,128 @@ class Environment:
         Check whether the environment is done
 
         Returns:
-            True or False
+            [True or False], or True or False for each car in the "car" mode
         """
 
+        if self.done_mode == "car":
+            return [car.nCollision > 0 or steps > MAX_STEP for car, steps in zip(self.cars, self.car_steps.tolist())]
+
         return [self.step_count > MAX_STEP or all([car.nCollision > 0 for car in self.cars])]
 
+    def respawn_cars(self, done):
+        """
+        Start a new episode for the finished cars, the other cars keep going
+
+        Args:
+            done: is done of each car
+        """
+
+        for i, (car, car_done) in enumerate(zip(self.cars, done)):
+            if car_done:
+                car.respawn()
+                self.car_steps[i] = 0
+                self.n_episodes += 1
+
+    def get_collision(self):
+        """
+        Check the collision with the walls of every car from a single contact query
+
+        Returns:
+            array shape(n, ) of bool, where `n` is a number of cars
+        """
+
+        car_ids = np.array([car.racecarUniqueId for car in self.cars])
+        contacts = self.p.getContactPoints()
+
+        if len(contacts) == 0:
+            collision = np.zeros(len(self.cars), dtype=bool)
+        else:
+            pairs = np.array([contact[1:3] for contact in contacts])
+            is_wall = np.isin(pairs, self.wall_ids)
+            hits = np.concatenate([pairs[is_wall[:, 0], 1], pairs[is_wall[:, 1], 0]])
+            collision = np.isin(car_ids, hits)
+
+        for car, c in zip(self.cars, collision):
+            car.collision = bool(c)
+
+        return collision
+
+    def get_angle_field(self):
+        """
+        Get the angle of direction to go for every car with a single lookup
+
+        Returns:
+            array shape(n, ) in Degrees, where `n` is a number of cars
+        """
+
+        coordinates = np.array([car.get_coordinate() for car in self.cars])
+        return self.direction_field.lookup(coordinates[:, 0], coordinates[:, 1])
+
     def get_info(self):
         """
         Get some information
 
         Returns:
-            dictionary
+            dictionary, the information of the cars is computed at the first access or before the next step
         """
 
-        res = {
-            "cars": [car.get_info() for car in self.cars],
+        res = LazyDict({
             "no_steps": self.step_count,
-        }
+            "reset_latency": self.reset_latency,
+        })
+        res.set_lazy("cars", lambda: [car.get_info() for car in self.cars])
+
+        if self.done_mode == "car":
+            res["car_steps"] = self.car_steps.tolist()
+            res["no_episodes"] = self.n_episodes
+
+        if isinstance(self.p, CallCounter):
+            res["bullet_calls"] = dict(self.p.counts)
+
+        if self.render_cache is not None:
+            res["render_cache"] = self.render_cache.get_info()
+
+        if self.info_keys is not None:
+            for key in list(res):
+                if key not in self.info_keys:
+                    del res[key]
+
+        self.info = res
+
         return res
 
+    def apply_actions(self, acts):
+        """
+        Apply the action of every car, the commands and the goal check are computed for all cars at once
+
+        Args:
+            acts: shape(n, 2) [speed, angle], or shape(n, 1) [angle] at full speed
+        """
+
+        acts = np.asarray(acts, dtype=np.float64)
+        if acts.shape[1] != 2:  # apply only angle, same as `BaseAgent.apply_action`
+            acts = np.stack([np.ones(len(acts)), acts[:, 0]], axis=-1)
+
+        speed_multiplier = np.array([car.speedMultiplier for car in self.cars])
+        steering_multiplier = np.array([car.steeringMultiplier for car in self.cars])
+        velocities = (acts[:, 0] * speed_multiplier).tolist()
+        angles = (acts[:, 1] * steering_multiplier).tolist()
+
+        for car, speed, velocity, angle in zip(self.cars, acts[:, 0].tolist(), velocities, angles):
+            car.speed = speed
+            car.apply_motor(velocity, angle)
+
+        # the pose is from the end of the previous step, as in `BaseAgent.apply_action`
+        coordinates = np.array([car.get_coordinate()[:2] for car in self.cars])
+        at_goal = np.all((coordinates >= GOAL_REGION[0]) & (coordinates <= GOAL_REGION[1]), axis=1)
+        for car, goal in zip(self.cars, at_goal.tolist()):
+            car.atGoal |= goal
+
     @timing('environment_step', debug=False)
     def step(self, acts):
         """
-        apply action to step environment
+        apply action to step environment, the action is held for `action_repeat` physics steps
+        and the reward is accumulated over them
 
         Args:
             acts: shape(n, 2), where `n` is a number of cars
@@ -144,20 +649,77 @@ class Environment:
             observation, reward, is done, info
         """
 
-        for car, act in zip(self.cars, acts):
-            car.apply_action(act)
+        # the information of the previous step reads the state before it changes
+        if self.info is not None:
+            self.info.expire()
+
+        if isinstance(self.p, CallCounter):
+            self.p.reset()
+
+        self.apply_actions(acts)
+
+        rew = [[0] for _ in self.cars]
+        for _ in range(self.action_repeat):
+            self.p.stepSimulation()
+            for car in self.cars:
+                car.clear_cache()
+            self.get_collision()
+            rew = [[r[0] + n[0]] for r, n in zip(rew, self.get_reward())]
+
+            # stop holding the action when every car is crashed
+            if all([car.nCollision > 0 for car in self.cars]):
+                break
 
-        self.p.stepSimulation()
         self.speed = acts[:, 0]
         self.step_count += 1
 
-        obs = self.get_obs()
-        rew = self.get_reward()
-        done = self.is_done()
-        info = self.get_info()
+        if self.done_mode == "car":
+            self.car_steps += 1
+            obs = self.get_obs()
+            done = self.is_done()
+            info = self.get_info()
+            if any(done):
+                indices = np.flatnonzero(done).tolist()
+                info.compute()
+                info["terminal_observation"] = self.get_terminal_observation(obs, indices)
+                # the observation is the start of the next episode, the other cars are not observed again
+                # (their Bullet camera may still show a respawned car at its old place)
+                self.respawn_cars(done)
+                obs = self.update_obs(obs, indices)
+        else:
+            obs = self.get_obs()
+            done = self.is_done()
+            info = self.get_info()
+            if self.auto_reset and done[0]:
+                info.compute()
+                info["terminal_observation"] = self.get_terminal_observation(obs, range(len(self.cars)))
+                obs = self.reset()
+
+        if self.obs_mode == "array":
+            self.rew_buffer[:] = [r[0] for r in rew]
+            self.done_buffer[:] = done
+            return obs, self.rew_buffer, self.done_buffer, info
 
         return obs, rew, done, info
 
+    def get_terminal_observation(self, obs, indices):
+        """
+        Copy the last observation of the finished cars, before they start a new episode
+
+        Args:
+            obs: observation from `get_obs`
+            indices: index of the finished cars
+
+        Returns:
+            dictionary {car index: observation dictionary}
+        """
+
+        if self.obs_mode == "array":
+            return {i: {key: value[i:i + 1].copy() for key, value in obs.items()} for i in indices}
+
+        return {i: obs[i] for i in indices}
+
+    @timing('environment_reset', debug=False)
     def reset(self):
         """
         Reset the environment
@@ -166,13 +728,45 @@ class Environment:
             observation for each car
         """
 
-        self._reset()  # reset environment
+        ts = time()
+
+        if self.info is not None:
+            self.info.expire()
+
+        if self.world_ready:
+            self._fast_reset()
+        else:
+            self._reset()  # reset environment
+
+            if self.n_reset != 1:  # restore car
+                self.restore_cars()
 
-        if self.n_reset != 1:  # restore car
-            self.restore_cars()
+            if self.reset_mode == "snapshot":
+                self.snapshot_id = self.p.saveState()
+            self.world_ready = self.reset_mode != "rebuild"
+
+        self.reset_latency = time() - ts
+        self.car_steps = np.zeros(len(self.cars), dtype=np.int64)
 
         return self.get_obs()
 
+    def _fast_reset(self):
+        """
+        Reset without rebuilding the world (snapshot or respawn)
+        """
+
+        if self.reset_mode == "snapshot":
+            self.p.restoreState(stateId=self.snapshot_id)
+            for car in self.cars:
+                car.reset_state()
+        else:
+            for car in self.cars:
+                car.respawn()
+
+        self.step_count = 0
+        self.n_collision = 0
+        self.n_reset += 1
+
     def sample_observation(self, with_shape=False):
         """
         Sample observation
@@ -181,7 +775,10 @@ class Environment:
             observation dict, (observation shape dict)
         """
 
-        sample_obs = self.get_obs()[0]
+        if self.obs_mode == "array":
+            sample_obs = {key: value[:1].copy() for key, value in self.get_obs().items()}
+        else:
+            sample_obs = self.get_obs()[0]
         shape_obs = None
 
         if with_shape:
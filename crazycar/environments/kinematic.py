@@ -0,0 +1,436 @@
+import math
+
+import numpy as np
+
+from crazycar.environments.environment import Environment
+from crazycar.environments.track import Track
+from crazycar.environments.ray_caster import RayCaster, point_segment_distance
+from crazycar.environments.constants import (
+    TIMESTEP_SIM, ORIGIN, MAX_STEP, ACTION_REPEAT, OBS_MODES,
+    KINEMATIC_PARAMS, KINEMATIC_BASE_OFFSET, KINEMATIC_SENSOR_OFFSET, KINEMATIC_FOOTPRINT,
+    KINEMATIC_CLEARANCE_RESOLUTION,
+)
+from crazycar.agents import SensorAgent
+from crazycar.agents.base import sensor_angles
+from crazycar.agents.constants import N_DISTANCE_SENSORS, SENSOR_RANGE, SENSOR_FOV, CAR_SIZE
+from crazycar.utils import timing, get_observation_shape
+
+
+def wrap_angle(angle):
+    """
+    Wrap angles into [-pi, pi)
+    """
+
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+class KinematicEnvironment:
+    """
+    Crazy Car Environment with a kinematic bicycle model instead of Bullet,
+    every car is a row of NumPy arrays, so thousands of cars can run in one process
+
+    Only the observation of `SensorAgent` is supported. A car is crashed when its footprint
+    touches a wall, then it stays where it is and gets the collision reward at every step.
+
+    Args:
+        map_id: which map to build (id of a track in `data/tracks` or path to a track file)
+        action_repeat: number of simulation steps for each action
+        params: parameters of the model (see `calibrate`), `KINEMATIC_PARAMS` if None
+        obs_mode: format of the observations, same as `Environment`
+        n_rays: number of distance sensors of each car
+        sensor_range: length of the distance sensors
+        sensor_fov: field of view of the distance sensors (Degrees)
+    """
+
+    def __init__(self, map_id=1, action_repeat=ACTION_REPEAT, params=None, obs_mode="list",
+                 n_rays=len(N_DISTANCE_SENSORS), sensor_range=SENSOR_RANGE, sensor_fov=SENSOR_FOV):
+        assert obs_mode in OBS_MODES, f"obs_mode must be one of {OBS_MODES}"
+
+        self.map_id = map_id
+        self.obs_mode = obs_mode
+        self.track = Track(map_id)
+        self.segments = self.track.segments + np.array(ORIGIN[:2])
+        self.ray_caster = RayCaster(self.segments, max_range=sensor_range)
+        self.direction_field = self.track.direction_field
+        self.action_repeat = action_repeat
+        self.params = dict(KINEMATIC_PARAMS, **(params or {}))
+
+        # rays in the frame of the sensor, same as `BaseAgent`
+        angles = np.radians(sensor_angles(n_rays, sensor_fov))
+        self.rays = np.stack([np.cos(angles), np.sin(angles)], axis=-1) * sensor_range
+
+        # distance to the closest wall on a grid, only the cars close to a wall need the exact check
+        rear, front, half_width = KINEMATIC_FOOTPRINT
+        self.car_radius = np.hypot(max(-rear, front), half_width)
+        resolution = KINEMATIC_CLEARANCE_RESOLUTION
+        self.clearance_min = self.segments.reshape((-1, 2)).min(axis=0)
+        shape = np.ceil((self.segments.reshape((-1, 2)).max(axis=0) - self.clearance_min) / resolution).astype(int) + 1
+        xs = self.clearance_min[0] + (np.arange(shape[0]) + 0.5) * resolution
+        ys = self.clearance_min[1] + (np.arange(shape[1]) + 0.5) * resolution
+        centers = np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1).reshape((-1, 2))
+        clearance = np.concatenate([point_segment_distance(chunk, self.segments).min(axis=1)
+                                    for chunk in np.array_split(centers, max(len(centers) // 4096, 1))])
+        self.clearance = (clearance.reshape(shape) - resolution * np.sqrt(2) / 2).astype(np.float32)
+
+        self.position_cars = []
+        self.start = np.zeros((0, 3))
+
+        # state of every car
+        self.pose = np.zeros((0, 3))  # x, y, yaw of the base
+        self.velocity = np.zeros(0)  # forward speed
+        self.steering = np.zeros(0)  # steering angle
+        self.speed = np.zeros(0)  # commanded speed (in the observation)
+        self.n_collision = np.zeros(0, dtype=np.int64)
+
+        # observation, reward and is done of the "array" mode, updated in place
+        self.obs_buffers = {"sensor": np.zeros((0, n_rays + 1), dtype=np.float32)}
+        self.rew_buffer = np.zeros(0, dtype=np.float32)
+        self.done_buffer = np.zeros(0, dtype=bool)
+
+        # variable for tracking
+        self.step_count = 0
+        self.n_reset = 0
+
+    def insert_car(self, car_obj, position):
+        """
+        Insert the car to position
+
+        Args:
+            car_obj: car object, must only observe the distance sensors (e.g. `SensorAgent`)
+            position: [x, y, angle (Radians)]
+        """
+
+        assert set(car_obj.observation_shapes) == {"sensor"}, \
+            f"{car_obj.__name__} is not supported by the kinematic model, only the sensor observation is"
+
+        # same spawn as `BaseAgent`, the base of the car is ahead of the origin of the URDF
+        x = ORIGIN[0] + position[0] + math.cos(position[2]) * KINEMATIC_BASE_OFFSET
+        y = ORIGIN[1] + position[1] - CAR_SIZE / 2 + math.sin(position[2]) * KINEMATIC_BASE_OFFSET
+
+        self.position_cars.append([car_obj, position])
+        self.start = np.concatenate([self.start, [[x, y, position[2]]]])
+
+    def get_sensor(self):
+        """
+        Get the distance sensors of every car
+
+        Returns:
+            array shape(n, r), where `n` is a number of cars and `r` is a number of rays
+        """
+
+        x, y, yaw = self.pose.T
+        cos, sin = np.cos(yaw)[:, None], np.sin(yaw)[:, None]
+        dx, dy = KINEMATIC_SENSOR_OFFSET
+        origins = np.stack([x + cos[:, 0] * dx - sin[:, 0] * dy, y + sin[:, 0] * dx + cos[:, 0] * dy], axis=-1)
+        rays = np.stack([cos * self.rays[:, 0] - sin * self.rays[:, 1], sin * self.rays[:, 0] + cos * self.rays[:, 1]],
+                        axis=-1)
+
+        return self.ray_caster.cast(origins, rays)
+
+    def get_obs(self):
+        """
+        Get observation of car in environment
+
+        Returns:
+            list (observation for each car), or dictionary of array shape(n_cars, ...) for the "array" mode
+        """
+
+        if self.obs_mode == "array":
+            sensor = self.obs_buffers["sensor"]
+            sensor[:, :-1] = self.get_sensor()
+            sensor[:, -1] = self.speed
+            return self.obs_buffers
+
+        sensor = np.concatenate([self.get_sensor(), self.speed[:, None]], axis=1)[:, None]
+        return [{"sensor": s} for s in sensor]
+
+    def get_collision(self):
+        """
+        Check the overlap between the footprint of every car and the wall segments
+
+        Returns:
+            array shape(n, ) of bool, where `n` is a number of cars
+        """
+
+        # broad phase, cars far enough from every wall
+        resolution = KINEMATIC_CLEARANCE_RESOLUTION
+        nx, ny = self.clearance.shape
+        ix = np.floor((self.pose[:, 0] - self.clearance_min[0]) / resolution).astype(np.int64)
+        iy = np.floor((self.pose[:, 1] - self.clearance_min[1]) / resolution).astype(np.int64)
+        inside = (0 <= ix) & (ix < nx) & (0 <= iy) & (iy < ny)
+        near = inside & (self.clearance[np.clip(ix, 0, nx - 1), np.clip(iy, 0, ny - 1)] <= self.car_radius)
+
+        collision = np.zeros(len(self.pose), dtype=bool)
+        if not near.any():
+            return collision
+
+        rear, front, half_width = KINEMATIC_FOOTPRINT
+        x, y, yaw = self.pose[near].T
+        cos, sin = np.cos(yaw)[:, None], np.sin(yaw)[:, None]
+
+        # wall segments in the frame of each car, shape(n, m)
+        sx, sy = self.segments[None, :, 0, 0] - x[:, None], self.segments[None, :, 0, 1] - y[:, None]
+        dx, dy = self.segments[None, :, 1, 0] - self.segments[None, :, 0, 0], \
+            self.segments[None, :, 1, 1] - self.segments[None, :, 0, 1]
+        start = [cos * sx + sin * sy, -sin * sx + cos * sy]
+        direction = [cos * dx + sin * dy, -sin * dx + cos * dy]
+
+        # clip each segment against the box of the car (Liang-Barsky)
+        t0 = np.zeros(sx.shape)
+        t1 = np.ones(sx.shape)
+        overlap = np.ones(sx.shape, dtype=bool)
+        bounds = [(direction[0], start[0], rear, front), (direction[1], start[1], -half_width, half_width)]
+        for p, q, low, high in bounds:
+            parallel = p == 0
+            overlap &= ~parallel | ((low <= q) & (q <= high))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ta, tb = (low - q) / p, (high - q) / p
+            t0 = np.where(parallel, t0, np.maximum(t0, np.minimum(ta, tb)))
+            t1 = np.where(parallel, t1, np.minimum(t1, np.maximum(ta, tb)))
+
+        collision[near] = (overlap & (t0 <= t1)).any(axis=1)
+
+        return collision
+
+    def get_angle_field(self):
+        """
+        Get the angle of direction to go for every car with a single lookup
+
+        Returns:
+            array shape(n, ) in Degrees, where `n` is a number of cars
+        """
+
+        return self.direction_field.lookup(self.pose[:, 0], self.pose[:, 1])
+
+    def is_done(self):
+        """
+        Check whether the environment is done
+
+        Returns:
+            True or False
+        """
+
+        return [self.step_count > MAX_STEP or bool(np.all(self.n_collision > 0))]
+
+    def get_info(self):
+        """
+        Get some information, arrays over the cars instead of one dictionary for each car
+
+        Returns:
+            dictionary
+        """
+
+        return {
+            "coordinate": self.pose.copy(),
+            "no_collision": self.n_collision.copy(),
+            "speed": self.speed.copy(),
+            "no_steps": self.step_count,
+        }
+
+    def simulate(self, acts):
+        """
+        Move every car one simulation step with the kinematic bicycle model,
+        the speed and the steering follow the command with a first order lag
+
+        Args:
+            acts: shape(n, 2), where `n` is a number of cars
+        """
+
+        params = self.params
+        moving = self.n_collision == 0
+
+        target_velocity = acts[:, 0] * params["speed_gain"]
+        target_steering = acts[:, 1] * params["steering_gain"]
+        self.velocity += (target_velocity - self.velocity) * min(params["speed_rate"] * TIMESTEP_SIM, 1)
+        self.steering += (target_steering - self.steering) * min(params["steering_rate"] * TIMESTEP_SIM, 1)
+        self.velocity[~moving] = 0
+
+        yaw = self.pose[:, 2]
+        self.pose[:, 0] += self.velocity * np.cos(yaw) * TIMESTEP_SIM
+        self.pose[:, 1] += self.velocity * np.sin(yaw) * TIMESTEP_SIM
+        self.pose[:, 2] = wrap_angle(yaw + self.velocity * np.tan(self.steering) / params["wheelbase"] * TIMESTEP_SIM)
+
+    @timing('kinematic_step', debug=False)
+    def step(self, acts):
+        """
+        apply action to step environment, the action is held for `action_repeat` simulation steps
+        and the reward is accumulated over them
+
+        Args:
+            acts: shape(n, 2), where `n` is a number of cars
+
+        Returns:
+            observation, reward, is done, info
+        """
+
+        acts = np.asarray(acts, dtype=np.float64)
+        if acts.shape[1] != 2:  # apply only angle, same as `BaseAgent.apply_action`
+            acts = np.stack([np.ones(len(acts)), acts[:, 0]], axis=-1)
+
+        rew = np.zeros(len(acts))
+        for _ in range(self.action_repeat):
+            self.simulate(acts)
+            collision = self.get_collision()
+            self.n_collision += collision
+            rew -= 50 * collision
+
+            if np.all(self.n_collision > 0):
+                break
+
+        self.speed = acts[:, 0].copy()
+        self.step_count += 1
+
+        obs = self.get_obs()
+        done = self.is_done()
+        info = self.get_info()
+
+        if self.obs_mode == "array":
+            self.rew_buffer[:] = rew
+            self.done_buffer[:] = done[0]
+            return obs, self.rew_buffer, self.done_buffer, info
+
+        return obs, rew[:, None].tolist(), done, info
+
+    @timing('kinematic_reset', debug=False)
+    def reset(self):
+        """
+        Reset the environment
+
+        Returns:
+            observation for each car
+        """
+
+        n_cars = len(self.start)
+        self.pose = self.start.copy()
+        self.velocity = np.zeros(n_cars)
+        self.steering = np.zeros(n_cars)
+        self.speed = np.zeros(n_cars)
+        self.n_collision = np.zeros(n_cars, dtype=np.int64)
+        self.step_count = 0
+
+        if len(self.rew_buffer) != n_cars:
+            self.obs_buffers = {"sensor": np.zeros((n_cars, len(self.rays) + 1), dtype=np.float32)}
+            self.rew_buffer = np.zeros(n_cars, dtype=np.float32)
+            self.done_buffer = np.zeros(n_cars, dtype=bool)
+        self.n_reset += 1
+
+        return self.get_obs()
+
+    def sample_observation(self, with_shape=False):
+        """
+        Sample observation
+
+        Returns:
+            observation dict, (observation shape dict)
+        """
+
+        if self.obs_mode == "array":
+            sample_obs = {key: value[:1].copy() for key, value in self.get_obs().items()}
+        else:
+            sample_obs = self.get_obs()[0]
+        shape_obs = None
+
+        if with_shape:
+            shape_obs = get_observation_shape(sample_obs)
+
+        return sample_obs, shape_obs
+
+
+def record_trajectories(map_id=1, position=(2.4, 1, math.pi / 2), n_episodes=20, hold=20, seed=0):
+    """
+    Record Bullet trajectories of a `SensorAgent` under random actions, until the first collision
+
+    Args:
+        map_id: map for the environment
+        position: start of the car [x, y, angle (Radians)]
+        n_episodes: number of episodes
+        hold: number of steps to hold each random action
+        seed: random seed
+
+    Returns:
+        list of (poses shape(t + 1, 3), actions shape(t, 2))
+    """
+
+    rng = np.random.default_rng(seed)
+    env = Environment(map_id=map_id, reset_mode="snapshot")
+    env.insert_car(SensorAgent, list(position))
+
+    trajectories = []
+    for _ in range(n_episodes):
+        env.reset()
+        car = env.cars[0]
+        poses, acts = [car.get_coordinate()], []
+        crashed = False
+        while not crashed:
+            act = rng.uniform(-1, 1, size=(1, 2))
+            for _ in range(hold):
+                _, _, done, _ = env.step(act)
+                crashed = car.nCollision > 0 or done[0]
+                if crashed:
+                    break
+                poses.append(car.get_coordinate())
+                acts.append(act[0])
+        if acts:
+            trajectories.append((np.array(poses), np.array(acts)))
+
+    return trajectories
+
+
+def calibrate(trajectories, timestep=TIMESTEP_SIM * ACTION_REPEAT):
+    """
+    Fit the parameters of the kinematic model to recorded Bullet trajectories
+
+    The speed lag is a linear least squares on the forward speed, the steering lag
+    is searched on a grid with a least squares fit of the yaw rate for each value
+
+    Args:
+        trajectories: list of (poses shape(t + 1, 3), actions shape(t, 2)), see `record_trajectories`
+        timestep: time between two poses
+
+    Returns:
+        dictionary of parameters for `KinematicEnvironment`
+    """
+
+    velocities, yaw_rates, acts = [], [], []
+    for poses, act in trajectories:
+        delta = np.diff(poses, axis=0)
+        yaw = poses[:-1, 2]
+        velocities.append((delta[:, 0] * np.cos(yaw) + delta[:, 1] * np.sin(yaw)) / timestep)
+        yaw_rates.append(wrap_angle(delta[:, 2]) / timestep)
+        acts.append(act)
+
+    # v[t] - v[t-1] = rate * dt * (gain * u[t] - v[t-1])
+    features = np.concatenate([np.stack([a[1:, 0], v[:-1]], axis=-1) for v, a in zip(velocities, acts)])
+    target = np.concatenate([np.diff(v) for v in velocities])
+    (a, b), *_ = np.linalg.lstsq(features, target, rcond=None)
+    speed_rate = -b / timestep
+    speed_gain = a / -b
+
+    # yaw rate = v * tan(steering) / wheelbase, where the steering follows gain * u with a lag
+    best = None
+    for steering_rate in np.linspace(1, 50, 50):
+        alpha = min(steering_rate * timestep, 1)
+        x, y = [], []
+        for v, w, a in zip(velocities, yaw_rates, acts):
+            steering = np.zeros(len(a))
+            steering[0] = a[0, 1] * alpha
+            for t in range(1, len(a)):
+                steering[t] = steering[t - 1] + (a[t, 1] - steering[t - 1]) * alpha
+            x.append(v * steering)
+            y.append(w)
+        x, y = np.concatenate(x), np.concatenate(y)
+        k = x @ y / (x @ x)  # gain / wheelbase, tan(s) ~ s
+        error = np.mean((y - k * x) ** 2)
+        if best is None or error < best[0]:
+            best = error, steering_rate, k
+
+    _, steering_rate, k = best
+    wheelbase = KINEMATIC_PARAMS["wheelbase"]
+
+    return {
+        "speed_gain": float(speed_gain),
+        "speed_rate": float(speed_rate),
+        "steering_gain": float(k * wheelbase),
+        "steering_rate": float(steering_rate),
+        "wheelbase": wheelbase,
+    }
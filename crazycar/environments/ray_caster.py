@@ -0,0 +1,144 @@
+import numpy as np
+
+
+def cross(a, b):
+    """
+    2D cross product over the last axis
+    """
+
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def point_segment_distance(points, segments):
+    """
+    Distance from every point to every segment
+
+    Args:
+        points: shape(n, 2)
+        segments: shape(m, 2, 2)
+
+    Returns:
+        array shape(n, m)
+    """
+
+    start = segments[None, :, 0]
+    direction = segments[None, :, 1] - segments[None, :, 0]
+    w = points[:, None] - start
+    length = np.maximum((direction ** 2).sum(axis=-1), 1e-12)
+    t = np.clip((w * direction).sum(axis=-1) / length, 0, 1)
+
+    return np.linalg.norm(w - t[..., None] * direction, axis=-1)
+
+
+class RayCaster:
+    """
+    Analytic 2D ray caster over the static wall segments of the track
+
+    With `max_range`, the track is split into a grid and each cell keeps only the segments
+    that a ray starting in it can reach, so a ray is only tested against these candidates
+
+    Args:
+        segments: array shape(m, 2, 2) of wall segments [[x0, y0], [x1, y1]]
+        max_range: maximum length of the rays (no broad phase if None)
+        cell_size: size of a cell of the broad phase
+    """
+
+    def __init__(self, segments, max_range=None, cell_size=0.25):
+        segments = np.asarray(segments, dtype=np.float64)
+
+        # extra degenerate segment at the end, used to pad the candidates, never hit
+        self.start = np.concatenate([segments[:, 0], [[0., 0.]]]).astype(np.float32)
+        self.direction = np.concatenate([segments[:, 1] - segments[:, 0], [[0., 0.]]]).astype(np.float32)
+        self.candidates = None
+
+        if max_range is None or len(segments) == 0:
+            return
+
+        # cover every origin from where a ray can reach a segment
+        self.cell_size = cell_size
+        self.grid_min = segments.reshape((-1, 2)).min(axis=0) - max_range
+        shape = np.ceil((segments.reshape((-1, 2)).max(axis=0) + max_range - self.grid_min) / cell_size).astype(int)
+
+        xs = self.grid_min[0] + (np.arange(shape[0]) + 0.5) * cell_size
+        ys = self.grid_min[1] + (np.arange(shape[1]) + 0.5) * cell_size
+        centers = np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1).reshape((-1, 2))
+        reachable = point_segment_distance(centers, segments) <= max_range + cell_size * np.sqrt(2) / 2
+
+        # padded table of candidates for each cell, shape(nx, ny, k)
+        k = max(reachable.sum(axis=1).max(), 1)
+        order = np.argsort(~reachable, axis=1, kind="stable")[:, :k]
+        self.candidates = np.where(np.take_along_axis(reachable, order, axis=1), order, len(segments))
+        self.candidates = self.candidates.reshape((shape[0], shape[1], k))
+
+    def cast(self, origins, rays):
+        """
+        Intersect every ray of every car with every (candidate) segment in one vectorized call
+
+        Args:
+            origins: shape(n, 2), start of the rays for each car
+            rays: shape(n, r, 2), vector from the start to the end of each ray
+
+        Returns:
+            hit fraction shape(n, r), 1 if the ray does not hit anything
+        """
+
+        fractions, _ = self._intersect(origins, rays)
+        return fractions.min(axis=2)
+
+    def cast_index(self, origins, rays):
+        """
+        Same as `cast`, with the segment hit by each ray
+
+        Returns:
+            hit fraction shape(n, r), index of the segment shape(n, r) (-1 if the ray does not hit anything)
+        """
+
+        fractions, candidates = self._intersect(origins, rays)
+        closest = fractions.argmin(axis=2)[..., None]
+        fraction = np.take_along_axis(fractions, closest, axis=2)[..., 0]
+
+        if candidates is not None:
+            closest = np.take_along_axis(candidates[:, None], closest, axis=2)
+        index = np.where(fraction < 1, closest[..., 0], -1)
+
+        return fraction, index
+
+    def _intersect(self, origins, rays):
+        """
+        Hit fraction of every ray with every (candidate) segment
+
+        Returns:
+            hit fraction shape(n, r, m), index of the candidates shape(n, m) (None without broad phase)
+        """
+
+        origins = np.asarray(origins, dtype=np.float32)
+        rays = np.asarray(rays, dtype=np.float32)
+
+        if self.candidates is None:
+            candidates = None
+            start = self.start[None]  # (1, m, 2)
+            direction = self.direction[None]
+        else:
+            nx, ny, _ = self.candidates.shape
+            ix = np.clip(((origins[:, 0] - self.grid_min[0]) / self.cell_size).astype(int), 0, nx - 1)
+            iy = np.clip(((origins[:, 1] - self.grid_min[1]) / self.cell_size).astype(int), 0, ny - 1)
+            candidates = self.candidates[ix, iy]  # (n, k)
+            start = self.start[candidates]
+            direction = self.direction[candidates]
+
+        # solve origin + t * ray = start + u * direction
+        w = start - origins[:, None]  # (n, m, 2)
+        t_num = cross(w, direction)[:, None]  # (n, 1, m)
+        w = w[:, None]
+        r = rays[:, :, None]  # (n, r, 1, 2)
+        direction = direction[:, None]
+        denom = cross(r, direction)  # (n, r, m)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv = 1 / denom
+            t = t_num * inv
+            u = cross(w, r) * inv
+
+        hit = (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+        return np.where(hit, t, np.float32(1)), candidates
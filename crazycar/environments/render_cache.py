@@ -0,0 +1,96 @@
+import math
+
+from collections import OrderedDict
+
+from crazycar.environments.constants import RENDER_CACHE_RESOLUTION, RENDER_CACHE_MEMORY
+
+
+class RenderCache:
+    """
+    LRU cache of camera frames keyed on the quantized pose of the camera,
+    valid because the track is static (the frame must not show another car)
+
+    Args:
+        resolution: size of a bin of the pose (position, angle (Radians))
+        memory: maximum size of the frames in bytes, the least recently used frames are dropped
+    """
+
+    def __init__(self, resolution=RENDER_CACHE_RESOLUTION, memory=RENDER_CACHE_MEMORY):
+        self.position_resolution, self.angle_resolution = resolution
+        self.memory = memory
+        self.frames = OrderedDict()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, pose):
+        """
+        Quantize the pose of the camera
+
+        Args:
+            pose: x, y, angle (Radians)
+
+        Returns:
+            key of the frame
+        """
+
+        x, y, yaw = pose
+        return (round(x / self.position_resolution),
+                round(y / self.position_resolution),
+                round((yaw % (2 * math.pi)) / self.angle_resolution) % round(2 * math.pi / self.angle_resolution))
+
+    def get(self, key):
+        """
+        Get the frame of a key, counted as a hit or a miss
+
+        Returns:
+            frame (read only) or None
+        """
+
+        frame = self.frames.get(key)
+        if frame is None:
+            self.misses += 1
+            return None
+
+        self.frames.move_to_end(key)
+        self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        """
+        Store the frame of a key, then drop the least recently used frames over the memory budget
+
+        Returns:
+            the stored frame (read only)
+        """
+
+        if key in self.frames:
+            self.n_bytes -= self.frames.pop(key).nbytes
+
+        frame = frame.copy()
+        frame.flags.writeable = False
+        self.frames[key] = frame
+        self.n_bytes += frame.nbytes
+
+        while self.n_bytes > self.memory and self.frames:
+            _, dropped = self.frames.popitem(last=False)
+            self.n_bytes -= dropped.nbytes
+
+        return frame
+
+    def get_info(self):
+        """
+        Metrics of the cache
+
+        Returns:
+            dictionary
+        """
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.,
+            "frames": len(self.frames),
+            "bytes": self.n_bytes,
+        }
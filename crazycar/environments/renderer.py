@@ -0,0 +1,108 @@
+import numpy as np
+
+from crazycar.environments.ray_caster import RayCaster
+from crazycar.environments.constants import RENDER_FAR, RENDER_CAMERA_Z, RENDER_LIGHT_DIRECTION, RENDER_AMBIENT, \
+    RENDER_DIFFUSE, RENDER_FLOOR_COLORS, RENDER_FLOOR_SQUARE, RENDER_BACKGROUND_COLOR
+from crazycar.agents.constants import CAMERA_WIDTH, CAMERA_HEIGHT
+
+
+# same weights as `rgb2gray`
+GRAY_WEIGHTS = np.array([0.2989, 0.5870, 0.1140])
+
+
+def shade_gray(color, shade):
+    """
+    Gray level of a color lit by `shade`, with the same rounding as the image of Bullet
+
+    Args:
+        color: rgb color in [0, 1], shape(..., 3)
+        shade: intensity of the light, shape(...)
+
+    Returns:
+        gray level in [0, 255]
+    """
+
+    rgb = np.floor(np.asarray(color)[..., :3] * 255 * np.asarray(shade)[..., None] + 1e-6)
+    return rgb @ GRAY_WEIGHTS
+
+
+class SoftwareRenderer:
+    """
+    Render the gray front camera of many cars at once from the static geometry of the track,
+    mimics the flat shading of Bullet (textured floor, lit walls, plain background)
+
+    Every column of the image is one 2D ray against the wall segments, then each row is
+    the floor, the wall or the background from the height of the wall at the hit.
+    The other cars are not rendered.
+
+    Args:
+        track: `Track` to render
+        origin: origin of the track
+        width: width of the image
+        height: height of the image
+    """
+
+    def __init__(self, track, origin, width=CAMERA_WIDTH, height=CAMERA_HEIGHT):
+        self.width = width
+        self.height = height
+
+        segments = track.segments + np.array(origin[:2])
+        self.ray_caster = RayCaster(segments)
+
+        # the 4 segments of each wall go counterclockwise, the outward normal is on the right
+        direction = segments[:, 1] - segments[:, 0]
+        normal = np.stack([direction[:, 1], -direction[:, 0]], axis=-1)
+        normal /= np.linalg.norm(normal, axis=-1, keepdims=True)
+        shade = RENDER_AMBIENT + RENDER_DIFFUSE * np.maximum(normal @ np.array(RENDER_LIGHT_DIRECTION), 0)
+
+        # gray level and top of the wall for each segment, the last item is for no hit
+        top = np.repeat(track.positions[:, 2] + track.half_extents[:, 2], 4) + origin[2]
+        self.background_gray = np.float32(shade_gray(np.array(RENDER_BACKGROUND_COLOR), 1.))
+        self.wall_gray = np.append(shade_gray(track.color, shade), self.background_gray).astype(np.float32)
+        self.wall_top = np.append(top, 0.).astype(np.float32)
+        self.floor_gray = shade_gray(np.array(RENDER_FLOOR_COLORS), 1.).astype(np.float32)
+
+        # pinhole camera with a field of view of 90 degrees, a column is forward + x * left
+        self.columns = (1 - (2 * np.arange(width) + 1) / width).astype(np.float32)
+        self.rows = (1 - (2 * np.arange(height) + 1) / height).astype(np.float32)
+
+    def render(self, poses, camera_z=RENDER_CAMERA_Z):
+        """
+        Render the camera of every car
+
+        Args:
+            poses: shape(n, 3), pose of each camera [x, y, angle (Radians)]
+            camera_z: height of the cameras
+
+        Returns:
+            gray images shape(n, height, width) float32 in [0, 255]
+        """
+
+        poses = np.asarray(poses, dtype=np.float32)
+        n = len(poses)
+        forward = np.stack([np.cos(poses[:, 2]), np.sin(poses[:, 2])], axis=-1)
+        left = np.stack([-forward[:, 1], forward[:, 0]], axis=-1)
+
+        # ray of each column, its forward component is 1, so the hit fraction is the depth / far
+        rays = (forward[:, None] + self.columns[None, :, None] * left[:, None]) * RENDER_FAR  # (n, w, 2)
+        fraction, index = self.ray_caster.cast_index(poses[:, :2], rays)
+        depth = fraction * RENDER_FAR  # (n, w)
+
+        rows = self.rows[None, :, None]  # (1, h, 1)
+        depth = depth[:, None]  # (n, 1, w)
+
+        # a row sees the wall between its bottom and its top at this depth
+        top = self.wall_top[index][:, None]
+        wall = (rows * depth >= -camera_z) & (rows * depth <= top - camera_z) & (index[:, None] >= 0)
+        image = np.where(wall, self.wall_gray[index][:, None], self.background_gray)
+
+        # the rows below the horizon see the floor in front of the wall
+        with np.errstate(divide="ignore"):
+            floor_depth = np.where(rows < 0, camera_z / -rows, np.inf)  # (1, h, 1)
+        floor = ~wall & (floor_depth <= depth)
+        floor_depth = np.broadcast_to(np.minimum(floor_depth, RENDER_FAR), (n, self.height, 1))
+        x = poses[:, None, None, 0] + floor_depth * rays[:, None, :, 0] / RENDER_FAR
+        y = poses[:, None, None, 1] + floor_depth * rays[:, None, :, 1] / RENDER_FAR
+        square = (np.floor(x / RENDER_FLOOR_SQUARE) + np.floor(y / RENDER_FLOOR_SQUARE)).astype(np.int64) % 2
+
+        return np.where(floor, self.floor_gray[square], image)
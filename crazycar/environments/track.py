@@ -0,0 +1,142 @@
+import os
+import json
+import numbers
+import hashlib
+import crazycar
+
+import numpy as np
+
+from crazycar.environments.direction_field import DirectionField
+from crazycar.environments.constants import DIRECTION_FIELD_RESOLUTION, TRACK_CACHE_DIR, TRACK_CACHE_VERSION
+
+
+MODULE_PATH = os.path.dirname(os.path.abspath(crazycar.__file__))
+
+
+class Track:
+    """
+    Race track described by a track file (JSON), compiled into arrays
+    and cached on disk by the hash of its content
+
+    The track file has:
+        "walls": list of {"size": [x, y, z], "position": [x, y, z], "yaw": angle (Degrees)}
+        "direction_field": list of [angle (Degrees), x_min, x_max, y_min, y_max]
+        "color": rgba color of the walls
+
+    Args:
+        track: id of a track in `data/tracks` or path to a track file
+        cache_dir: directory for the compiled tracks (no cache if None)
+    """
+
+    def __init__(self, track, cache_dir=TRACK_CACHE_DIR):
+        if isinstance(track, numbers.Integral):
+            track = os.path.join(MODULE_PATH, f"data/tracks/map{track}.json")
+        self.path = track
+
+        with open(self.path, "rb") as f:
+            content = f.read()
+
+        # the compiled direction field depends on its resolution
+        settings = f"{TRACK_CACHE_VERSION}:{DIRECTION_FIELD_RESOLUTION}"
+        key = hashlib.sha1(content + settings.encode()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{key}.npz") if cache_dir else None
+
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path) as f:
+                compiled = dict(f)
+        else:
+            compiled = self.compile(json.loads(content))
+            if cache_path:
+                self._save(cache_path, compiled)
+
+        self.half_extents = compiled["half_extents"]
+        self.positions = compiled["positions"]
+        self.orientations = compiled["orientations"]
+        self.segments = compiled["segments"]
+        self.color = compiled["color"]
+        self.direction_field = DirectionField(compiled["regions"], grid=compiled["grid"])
+
+    @staticmethod
+    def compile(description):
+        """
+        Compile the track description into arrays
+
+        Args:
+            description: dictionary from the track file
+
+        Returns:
+            dictionary of arrays
+        """
+
+        walls = description["walls"]
+        yaw = np.radians([wall["yaw"] for wall in walls])
+        orientations = np.zeros((len(walls), 4))
+        orientations[:, 2] = np.sin(yaw / 2)
+        orientations[:, 3] = np.cos(yaw / 2)
+
+        half_extents = np.array([wall["size"] for wall in walls]) / 2
+        positions = np.array([wall["position"] for wall in walls], dtype=np.float64)
+
+        # footprint of each wall, 4 segments per box
+        corners = np.array([[1, 1], [-1, 1], [-1, -1], [1, -1]]) * half_extents[:, None, :2]
+        rotation = np.stack([np.cos(yaw), -np.sin(yaw), np.sin(yaw), np.cos(yaw)], axis=-1).reshape((-1, 2, 2))
+        corners = np.einsum("nij,nkj->nki", rotation, corners) + positions[:, None, :2]
+        segments = np.stack([corners, np.roll(corners, -1, axis=1)], axis=2).reshape((-1, 2, 2))
+
+        direction_field = DirectionField(description["direction_field"], resolution=DIRECTION_FIELD_RESOLUTION)
+
+        return {
+            "half_extents": half_extents,
+            "positions": positions,
+            "orientations": orientations,
+            "segments": segments,
+            "color": np.array(description.get("color", [1, 1, 1, 1]), dtype=np.float64),
+            "regions": direction_field.regions,
+            "grid": direction_field.grid,
+        }
+
+    @staticmethod
+    def _save(cache_path, compiled):
+        """
+        Write the compiled track, through a temporary file so concurrent writers are safe
+        """
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path[:-len('.npz')]}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **compiled)
+        os.replace(tmp_path, cache_path)
+
+    def build(self, p, origin):
+        """
+        Spawn every wall as a single static multi-body with many collision shapes
+
+        Args:
+            p: bullet client
+            origin: origin of the track
+
+        Returns:
+            id of the track body
+        """
+
+        n = len(self.half_extents)
+        col = p.createCollisionShapeArray(
+            shapeTypes=[p.GEOM_BOX] * n,
+            halfExtents=self.half_extents.tolist(),
+            collisionFramePositions=self.positions.tolist(),
+            collisionFrameOrientations=self.orientations.tolist()
+        )
+        vis = p.createVisualShapeArray(
+            shapeTypes=[p.GEOM_BOX] * n,
+            halfExtents=self.half_extents.tolist(),
+            visualFramePositions=self.positions.tolist(),
+            visualFrameOrientations=self.orientations.tolist()
+        )
+        track_id = p.createMultiBody(
+            baseMass=0,
+            baseCollisionShapeIndex=col,
+            baseVisualShapeIndex=vis,
+            basePosition=origin
+        )
+        p.changeVisualShape(track_id, -1, rgbaColor=self.color.tolist())
+
+        return track_id
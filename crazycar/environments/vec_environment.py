@@ -0,0 +1,243 @@
+import multiprocessing
+
+import numpy as np
+
+from crazycar.environments.environment import Environment
+from crazycar.agents.constants import N_DISTANCE_SENSORS
+
+
+def _worker(remote, parent_remote, index, map_id, position_cars, buffers, auto_reset, env_kwargs):
+    """
+    Run one environment inside a worker process
+
+    Args:
+        remote: pipe for this worker
+        parent_remote: pipe of the main process (closed here)
+        index: index of this environment
+        map_id: map for the environment
+        position_cars: list of [car class, position]
+        buffers: dictionary of (shared array, shape) for each observation key
+        auto_reset: reset the environment when the episode is done, after the reply of the step
+        env_kwargs: additional arguments for the environment
+    """
+
+    parent_remote.close()
+
+    env = Environment(map_id=map_id, **env_kwargs)
+    for car_obj, position in position_cars:
+        env.insert_car(car_obj, position)
+
+    # view on the shared observation of this environment
+    obs_buffers = {
+        key: np.frombuffer(raw, dtype=np.float32).reshape(shape)[index]
+        for key, (raw, shape) in buffers.items()
+    }
+
+    def write(obs):
+        if isinstance(obs, dict):  # "array" mode
+            for key, value in obs.items():
+                obs_buffers[key][:] = value
+            return
+        for car_idx, car_obs in enumerate(obs):
+            for key, value in car_obs.items():
+                obs_buffers[key][car_idx] = value[0]
+
+    def copy(obs):
+        if isinstance(obs, dict):
+            return {key: value.copy() for key, value in obs.items()}
+        return obs
+
+    # rebuild and snapshot resets restore the whole world, so the first observation is known before the reset
+    # is done, respawn only moves the cars back and is done before the reply
+    prefetch = env.reset_mode != "respawn"
+    initial_obs = None
+
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                obs, rew, done, info = env.step(data)
+                if auto_reset and env.done_mode == "episode" and done[0]:
+                    info["terminal_observation"] = env.get_terminal_observation(obs, range(len(env.cars)))
+                    if prefetch:
+                        write(initial_obs)
+                        remote.send((rew, done, info))
+                        initial_obs = copy(env.reset())  # while the other workers and the learner run
+                    else:
+                        info.compute()  # the lazy info reads the state before the reset
+                        write(env.reset())
+                        remote.send((rew, done, info))
+                else:
+                    write(obs)
+                    remote.send((rew, done, info))
+            elif cmd == "reset":
+                initial_obs = copy(env.reset())
+                write(initial_obs)
+                remote.send(None)
+            elif cmd == "close":
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+
+class VecEnvironment:
+    """
+    Vectorized Crazy Car Environment, each environment is running in its own process
+    and the observations are returned through shared memory
+
+    Args:
+        n_envs: number of environments
+        map_id: map for every environment
+        start_method: multiprocessing start method (default of the platform if None)
+        auto_reset: reset a finished environment within `step` (see `Environment`), the reset runs
+            in the worker after its reply, overlapped with the next steps of the other environments
+            (before the reply with reset_mode="respawn")
+        env_kwargs: additional arguments for each environment, `ray_threads` is 1 by default
+            so that the workers do not each start a thread for every core
+
+    The observations returned by `step` and `reset` are views on the shared memory, updated in place
+    by the workers (copy them to keep them)
+    """
+
+    def __init__(self, n_envs, map_id=1, start_method=None, auto_reset=False, **env_kwargs):
+        self.n_envs = n_envs
+        self.map_id = map_id
+        self.auto_reset = auto_reset
+        self.env_kwargs = {"ray_threads": 1, **env_kwargs}
+        self.position_cars = []
+        self.ctx = multiprocessing.get_context(start_method)
+
+        self.remotes = []
+        self.processes = []
+        self.obs_buffers = {}
+        self.started = False
+
+    def insert_car(self, car_obj, position):
+        """
+        Insert the car to position in every environment
+
+        Args:
+            car_obj: car object for create
+            position: [x, y, angle (Radians)]
+        """
+
+        if self.started:
+            raise RuntimeError("cannot insert a car after the workers are started")
+
+        self.position_cars.append([car_obj, position])
+
+    def _start(self):
+        """
+        Allocate shared observations and start the workers
+        """
+
+        n_cars = len(self.position_cars)
+
+        n_rays = self.env_kwargs.get("n_rays", len(N_DISTANCE_SENSORS))
+        shapes = {}
+        for car_obj, _ in self.position_cars:
+            shapes.update(car_obj.get_observation_shapes(n_rays))
+
+        buffers = {}
+        for key, shape in shapes.items():
+            shape = (self.n_envs, n_cars) + tuple(shape)
+            raw = self.ctx.RawArray('f', int(np.prod(shape)))
+            buffers[key] = (raw, shape)
+            self.obs_buffers[key] = np.frombuffer(raw, dtype=np.float32).reshape(shape)
+
+        for index in range(self.n_envs):
+            remote, work_remote = self.ctx.Pipe()
+            process = self.ctx.Process(
+                target=_worker,
+                args=(work_remote, remote, index, self.map_id, self.position_cars, buffers, self.auto_reset,
+                      self.env_kwargs),
+                daemon=True
+            )
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        self.started = True
+
+    def get_obs(self):
+        """
+        Get observation of every car in every environment
+
+        Returns:
+            dictionary of array shape(n_envs, n_cars, ...) for each key, views on the shared memory
+            that are overwritten at the next step or reset (copy them to keep them)
+        """
+
+        return dict(self.obs_buffers)
+
+    def step(self, acts):
+        """
+        Apply action to step every environment
+
+        Args:
+            acts: shape(n_envs, n_cars, act_dim)
+
+        Returns:
+            observation, reward shape(n_envs, n_cars), is done shape(n_envs, ) (shape(n_envs, n_cars) for
+            done_mode="car", the finished cars are already respawned), list of info (computed in the workers,
+            select what is needed with `info_keys`)
+        """
+
+        for remote, act in zip(self.remotes, acts):
+            remote.send(("step", np.asarray(act)))
+        results = [remote.recv() for remote in self.remotes]
+        rews, dones, infos = zip(*results)
+
+        rew = np.array(rews, dtype=np.float32).reshape((self.n_envs, -1))
+        done = np.array(dones, dtype=bool).reshape((self.n_envs, -1))
+        if self.env_kwargs.get("done_mode", "episode") == "episode":
+            done = done.all(axis=1)
+
+        return self.get_obs(), rew, done, list(infos)
+
+    def reset(self, indices=None):
+        """
+        Reset the environments
+
+        Args:
+            indices: which environments to reset (all if None)
+
+        Returns:
+            observation for every environment
+        """
+
+        if not self.started:
+            self._start()
+
+        if indices is None:
+            indices = range(self.n_envs)
+
+        for i in indices:
+            self.remotes[i].send(("reset", None))
+        for i in indices:
+            self.remotes[i].recv()
+
+        return self.get_obs()
+
+    def close(self):
+        """
+        Stop the workers
+        """
+
+        if not self.started:
+            return
+
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        for remote in self.remotes:
+            remote.close()
+
+        self.remotes = []
+        self.processes = []
+        self.obs_buffers = {}
+        self.started = False
@@ -0,0 +1,672 @@
+import os
+import sys
+import json
+import zlib
+import numpy as np
+
+
+# observations of camera frames in [0, 255], stored as uint8
+IMAGE_KEYS = ("image", )
+
+
+class ReplayBuffer:
+    """
+    Experience replay for RL on preallocated ring buffers, one typed NumPy array for each field
+    ("obs/sensor", "obs/image", "act", "rew", "done"), allocated at the first `store` from the shape of the data
+
+    Images are stored as uint8 (rounded gray levels), optionally compressed frame by frame with zlib,
+    and only the sampled batch is converted to float
+
+    Observations are stored once per step: slot `i` holds the observation of transition `i` and its next
+    observation is the frame of slot `i + 1`. When an episode ends the terminal observation keeps its own slot,
+    which holds no transition, and the next episode starts after it
+
+    Sampling draws random indices and gathers each field once, so it does not depend on the size of the buffer
+
+    Args:
+        maxlen: number of slots, the oldest ones are overwritten
+        compress: zlib level to compress each image (0 to store the uint8 arrays)
+    """
+
+    def __init__(self, maxlen=int(1e6), compress=0):
+        self.maxlen = int(maxlen)
+        self.compress = compress
+        self.frames = {}  # observation for each slot
+        self.frame_shapes = {}
+        self.fields = {}  # act, rew, done of the transition starting at each slot
+        self.valid = np.zeros(self.maxlen, dtype=bool)  # whether a transition starts at the slot
+        self.index = 0  # slot of the next transition, its observation is already stored when continuing
+        self.n_slots = 0  # slots holding an observation
+        self.size = 0  # number of transitions
+        self.last_done = True
+        self.pending = {}  # next observation of the last transition, as stored
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def flatten(data):
+        """
+        Flatten the fields of a transition
+
+        Args:
+            data: dictionary of the fields, the observations have a batch axis of 1
+
+        Returns:
+            dictionary of array for each field
+        """
+
+        return {key: np.asarray(value) for key, value in data.items()}
+
+    @staticmethod
+    def flatten_obs(obs):
+        """
+        Remove the batch axis of an observation and quantize the images
+
+        Args:
+            obs: dictionary of observation with a batch axis of 1
+
+        Returns:
+            dictionary of array for each observation, uint8 images and float32 others
+        """
+
+        flat = {}
+        for key, value in obs.items():
+            value = np.asarray(value)[0]
+            if key in IMAGE_KEYS:
+                flat[key] = np.clip(np.rint(value), 0, 255).astype(np.uint8)
+            else:
+                flat[key] = value.astype(np.float32)
+        return flat
+
+    def allocate(self, obs, flat):
+        """
+        Allocate the array of each field
+
+        Args:
+            obs: observation of a transition
+            flat: other fields of a transition
+        """
+
+        for key, value in obs.items():
+            self.frame_shapes[key] = value.shape
+            if key in IMAGE_KEYS and self.compress:
+                self.frames[key] = np.empty(self.maxlen, dtype=object)
+            else:
+                self.frames[key] = np.zeros((self.maxlen, ) + value.shape, dtype=value.dtype)
+        for key, value in flat.items():
+            dtype = bool if key == "done" else np.float32
+            self.fields[key] = np.zeros((self.maxlen, ) + value.shape, dtype=dtype)
+
+    def rows(self, slot):
+        """
+        Arrays to write a slot into
+
+        Args:
+            slot: index of the slot
+
+        Returns:
+            observation arrays, field arrays and row of the slot in them
+        """
+
+        return self.frames, self.fields, slot
+
+    def write_fields(self, slot, flat):
+        """
+        Write the fields of a transition into a slot
+
+        Args:
+            slot: index of the slot
+            flat: act, rew, done of the transition
+        """
+
+        _, fields, row = self.rows(slot)
+        for key, value in flat.items():
+            fields[key][row] = value
+        self.valid[slot] = True
+        self.size += 1
+
+    def write_frame(self, slot, obs):
+        """
+        Write an observation into a slot, the transition of the slot is lost
+
+        Args:
+            slot: index of the slot
+            obs: observation without batch axis
+        """
+
+        frames, _, row = self.rows(slot)
+        for key, value in obs.items():
+            if frames[key].dtype == object:
+                frames[key][row] = zlib.compress(value.tobytes(), self.compress)
+            else:
+                frames[key][row] = value
+        if self.valid[slot]:
+            self.valid[slot] = False
+            self.size -= 1
+        self.n_slots = min(self.n_slots + 1, self.maxlen)
+
+    def continues(self, obs):
+        """
+        Whether an observation follows the last transition
+
+        Args:
+            obs: observation without batch axis
+
+        Returns:
+            True when the last transition did not end its episode and its next observation is `obs`
+        """
+
+        if self.last_done:
+            return False
+        return all(np.array_equal(self.pending[key], value) for key, value in obs.items())
+
+    def store(self, dict_data):
+        """
+        Store data
+
+        Args:
+            dict_data:
+            {
+                "obs": xxx
+                "act": xxx
+                "next_obs": xxx
+                "rew": xxx
+                "done": xxx
+            }
+        """
+
+        obs = self.flatten_obs(dict_data["obs"])
+        next_obs = self.flatten_obs(dict_data["next_obs"])
+        flat = self.flatten({key: value for key, value in dict_data.items() if key not in ("obs", "next_obs")})
+        if not self.frames:
+            self.allocate(obs, flat)
+
+        if not self.continues(obs):
+            if self.n_slots:  # keep the terminal observation of the last episode
+                self.index = (self.index + 1) % self.maxlen
+            self.write_frame(self.index, obs)
+
+        self.write_fields(self.index, flat)
+
+        self.index = (self.index + 1) % self.maxlen
+        self.write_frame(self.index, next_obs)
+        self.pending = next_obs
+        self.last_done = bool(np.any(flat["done"])) if "done" in flat else False
+
+    def gather(self, idx):
+        """
+        Gather the transitions at some indices
+
+        Args:
+            idx: array of indices of valid slots
+
+        Returns:
+            dictionary of batch for each, uint8 images and float32 others
+        """
+
+        next_idx = (idx + 1) % self.maxlen
+        batch = {
+            "obs": {key: self.gather_frames(key, idx) for key in self.frames},
+            "next_obs": {key: self.gather_frames(key, next_idx) for key in self.frames},
+        }
+        for key, array in self.fields.items():
+            batch[key] = array[idx].astype(np.float32, copy=False)
+        return batch
+
+    def gather_frames(self, key, idx):
+        """
+        Gather an observation at some indices, decompressing the images
+
+        Args:
+            key: name of the observation
+            idx: array of indices
+
+        Returns:
+            array of the observation
+        """
+
+        array = self.frames[key]
+        if array.dtype != object:
+            return array[idx]
+        out = np.empty((len(idx), ) + self.frame_shapes[key], dtype=np.uint8)
+        for i, frame in enumerate(array[idx]):
+            out[i] = np.frombuffer(zlib.decompress(frame), dtype=np.uint8).reshape(self.frame_shapes[key])
+        return out
+
+    def sample_indices(self, size):
+        """
+        Sample indices of slots holding a transition
+
+        Args:
+            size: number of indices
+
+        Returns:
+            array of indices
+        """
+
+        idx = np.random.randint(0, self.n_slots, size)
+        invalid = ~self.valid[idx]
+        while invalid.any():  # terminal observations and the newest slot, once per episode
+            idx[invalid] = np.random.randint(0, self.n_slots, np.count_nonzero(invalid))
+            invalid = ~self.valid[idx]
+        return idx
+
+    def process(self, batch):
+        """
+        Process the sampled batch (e.g. to tensors)
+
+        Args:
+            batch: dictionary of batch for each, uint8 images and float32 others
+
+        Returns:
+            dictionary of batch for each, float32 arrays
+        """
+
+        return {
+            key: {sub_key: sub_value.astype(np.float32) for sub_key, sub_value in value.items()}
+            if isinstance(value, dict) else value
+            for key, value in batch.items()
+        }
+
+    def sample(self, size=256):
+        idx = self.sample_indices(size)
+        return self.process(self.gather(idx))
+
+    @property
+    def nbytes(self):
+        arrays = list(self.frames.values()) + list(self.fields.values()) + [self.valid]
+        total = sum(array.nbytes for array in arrays)
+        for array in self.frames.values():  # the compressed frames are referenced by the arrays
+            if array.dtype == object:
+                total += sum(sys.getsizeof(frame) for frame in array if frame is not None)
+        return total
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    """
+    Experience replay on `np.memmap` files in a run directory, for buffers larger than the memory
+
+    The recent slots are written into an in-memory tail and written to the files in blocks when the tail is full.
+    The files and "meta.json" are a snapshot after `flush`, opening the same directory again resumes from it
+    without loading the data
+
+    Args:
+        path: run directory of the files
+        maxlen: number of slots, the oldest ones are overwritten (ignored when reopening)
+        tail: number of slots kept in memory
+    """
+
+    def __init__(self, path, maxlen=int(1e7), tail=int(1e4)):
+        super().__init__(maxlen)
+        self.path = path
+        self.tail = int(tail)
+        self.tail_frames = {}
+        self.tail_fields = {}
+        self.start = 0  # slot of the first row of the tail
+        self.end = 0  # rows of the tail written
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self.file("meta.json")):
+            self.open()
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def open(self):
+        """
+        Open the files of the run directory
+        """
+
+        with open(self.file("meta.json")) as f:
+            meta = json.load(f)
+
+        self.maxlen = meta["maxlen"]
+        self.index = meta["index"]
+        self.n_slots = meta["n_slots"]
+        self.size = meta["size"]
+        self.start = (self.index + 1) % self.maxlen
+        self.frames = {key: np.lib.format.open_memmap(self.file(f"obs_{key}.npy"), mode="r+")
+                       for key in meta["frames"]}
+        self.fields = {key: np.lib.format.open_memmap(self.file(f"{key}.npy"), mode="r+")
+                       for key in meta["fields"]}
+        self.valid = np.array(np.lib.format.open_memmap(self.file("valid.npy"), mode="r"))
+        self.allocate_tail()
+
+    def allocate(self, obs, flat):
+        """
+        Create the file of each field
+
+        Args:
+            obs: observation of a transition
+            flat: other fields of a transition
+        """
+
+        for key, value in obs.items():
+            self.frames[key] = np.lib.format.open_memmap(
+                self.file(f"obs_{key}.npy"), mode="w+", dtype=value.dtype, shape=(self.maxlen, ) + value.shape
+            )
+        for key, value in flat.items():
+            dtype = bool if key == "done" else np.float32
+            self.fields[key] = np.lib.format.open_memmap(
+                self.file(f"{key}.npy"), mode="w+", dtype=dtype, shape=(self.maxlen, ) + value.shape
+            )
+        np.lib.format.open_memmap(self.file("valid.npy"), mode="w+", dtype=bool, shape=(self.maxlen, ))
+        self.allocate_tail()
+
+    def allocate_tail(self):
+        self.tail_frames = {key: np.zeros((self.tail, ) + array.shape[1:], dtype=array.dtype)
+                            for key, array in self.frames.items()}
+        self.tail_fields = {key: np.zeros((self.tail, ) + array.shape[1:], dtype=array.dtype)
+                            for key, array in self.fields.items()}
+
+    def rows(self, slot):
+        """
+        Arrays to write a slot into, the tail is written to the files when the slot is out of it
+
+        Args:
+            slot: index of the slot
+
+        Returns:
+            observation arrays, field arrays and row of the slot in them
+        """
+
+        row = slot - self.start
+        if not 0 <= row < min(self.tail, self.maxlen - self.start):
+            self.write_tail()
+            self.start, row = slot, 0
+        self.end = max(self.end, row + 1)
+        return self.tail_frames, self.tail_fields, row
+
+    def write_tail(self):
+        """
+        Write the rows of the tail to the files, one block for each field
+        """
+
+        stop = self.start + self.end
+        for arrays, tail_arrays in [(self.frames, self.tail_frames), (self.fields, self.tail_fields)]:
+            for key, array in arrays.items():
+                array[self.start:stop] = tail_arrays[key][:self.end]
+        self.end = 0
+
+    def flush(self):
+        """
+        Write the tail and the metadata, the run directory is then a snapshot of the buffer
+        """
+
+        if not self.frames:
+            return
+        self.write_tail()
+        for array in list(self.frames.values()) + list(self.fields.values()):
+            array.flush()
+        valid = np.lib.format.open_memmap(self.file("valid.npy"), mode="r+")
+        valid[:] = self.valid
+        valid.flush()
+
+        meta = {
+            "maxlen": self.maxlen,
+            "index": self.index,
+            "n_slots": self.n_slots,
+            "size": self.size,
+            "frames": list(self.frames),
+            "fields": list(self.fields),
+        }
+        with open(self.file("meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        # resume with a new episode after the pending observation, which becomes the terminal one
+        self.last_done = True
+        self.start = (self.index + 1) % self.maxlen
+
+    def read(self, array, tail_array, idx):
+        """
+        Read rows of a field from the tail and from the file in increasing order of slots
+
+        Args:
+            array: array of the file
+            tail_array: array of the tail
+            idx: array of indices
+
+        Returns:
+            array of the rows
+        """
+
+        out = np.empty((len(idx), ) + array.shape[1:], dtype=array.dtype)
+        row = idx - self.start
+        in_tail = (row >= 0) & (row < self.end)
+        out[in_tail] = tail_array[row[in_tail]]
+
+        on_disk = np.flatnonzero(~in_tail)
+        order = on_disk[np.argsort(idx[on_disk], kind="stable")]
+        out[order] = array[idx[order]]
+        return out
+
+    def gather(self, idx):
+        """
+        Gather the transitions at some indices
+
+        Args:
+            idx: array of indices of valid slots
+
+        Returns:
+            dictionary of batch for each, uint8 images and float32 others
+        """
+
+        next_idx = (idx + 1) % self.maxlen
+        batch = {
+            "obs": {key: self.read(array, self.tail_frames[key], idx) for key, array in self.frames.items()},
+            "next_obs": {key: self.read(array, self.tail_frames[key], next_idx) for key, array in self.frames.items()},
+        }
+        for key, array in self.fields.items():
+            batch[key] = self.read(array, self.tail_fields[key], idx).astype(np.float32, copy=False)
+        return batch
+
+
+class SumTree:
+    """
+    Sum tree in a flat array, node `i` is the sum of the nodes `2 * i` and `2 * i + 1`, the root is node 1
+    and the leaves are the nodes `size + index`
+
+    Updates and searches are batched in NumPy, looping only over the levels of the tree: a search costs
+    a few NumPy calls for each level whatever the number of values, so large batches of values are much faster
+    per value than small ones
+
+    Args:
+        capacity: number of leaves
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.depth = max(1, int(np.ceil(np.log2(self.capacity))))
+        self.size = 1 << self.depth
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def priorities(self, idx):
+        return self.tree[self.size + idx]
+
+    def set(self, index, priority):
+        """
+        Set the priority of one leaf
+
+        Args:
+            index: index of the leaf
+            priority: priority
+        """
+
+        node = self.size + int(index)
+        self.tree[node] = priority
+        while node > 1:
+            node >>= 1
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+
+    def update(self, idx, priorities):
+        """
+        Set the priorities of some leaves
+
+        Args:
+            idx: array of indices of the leaves
+            priorities: array of priorities
+        """
+
+        node = np.asarray(idx, dtype=np.intp) + self.size
+        self.tree[node] = priorities
+        for _ in range(self.depth):
+            # the parents of duplicated nodes are written with the same sum
+            node >>= 1
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+
+    def find(self, values):
+        """
+        Find the leaves where the cumulative sum of the priorities reaches some values
+
+        The upper levels are searched at once: the nodes of one level (about an eighth as many as the values)
+        are summed cumulatively and each node finds the number of values below its end with `searchsorted`,
+        then the values descend the remaining levels together
+
+        Args:
+            values: array of values in [0, total), sorted in increasing order
+
+        Returns:
+            array of indices of the leaves
+        """
+
+        values = np.array(values, dtype=np.float64)
+        level = int(np.clip(np.log2(max(len(values), 1)) - 3, 1, self.depth))
+        first = 1 << level
+        nodes = self.tree[first:2 * first]
+        cumsum = np.cumsum(nodes)
+
+        ends = np.searchsorted(values, cumsum, side="right")
+        counts = np.diff(ends, prepend=0)
+        counts[-1] += len(values) - ends[-1]  # rounding at the end of the last node
+        node = np.repeat(np.arange(first, 2 * first), counts)
+        values -= np.repeat(cumsum - nodes, counts)
+        for _ in range(self.depth - level):
+            node <<= 1
+            left = self.tree[node]
+            right = values >= left
+            values -= left * right
+            node += right
+        return np.minimum(node - self.size, self.capacity - 1)
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Prioritized experience replay (https://arxiv.org/abs/1511.05952) on a sum tree of the slots
+
+    New transitions get the maximum priority, `update_priorities` sets the priorities of the last sampled ones
+    from their TD errors. The sampled batch has the importance weights in "weights" shape(size, 1)
+
+    The indices of `block` batches are searched in the tree at once and the next batches are served from them,
+    so the priorities set in between (new transitions included) are sampled from the next block on. The importance
+    weights use the probabilities the indices were drawn with
+
+    Args:
+        maxlen: number of slots, the oldest ones are overwritten
+        compress: zlib level to compress each image (0 to store the uint8 arrays)
+        alpha: exponent of the priorities, 0 for uniform sampling
+        beta: exponent of the importance weights, 1 for full correction
+        eps: added to the TD errors so that no transition has a priority of 0
+        block: number of batches sampled at once (1 to sample each batch from the current priorities)
+    """
+
+    def __init__(self, maxlen=int(1e6), compress=0, alpha=0.6, beta=0.4, eps=1e-6, block=1024):
+        super().__init__(maxlen, compress)
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.block = block
+        self.tree = SumTree(self.maxlen)
+        self.max_priority = 1.
+        self.indices = None  # slots of the last sampled batch
+        self.probabilities = None  # probabilities the last sampled batch was drawn with
+        self.block_indices = np.empty((0, 0), dtype=np.intp)  # one batch in each row
+        self.block_probabilities = np.empty((0, 0))
+        self.row = 0  # next batch of the block
+
+    def write_fields(self, slot, flat):
+        super().write_fields(slot, flat)
+        self.tree.set(slot, self.max_priority)
+
+    def write_frame(self, slot, obs):
+        super().write_frame(slot, obs)
+        if not self.valid[slot]:
+            self.tree.set(slot, 0.)
+
+    def sample_block(self, size):
+        """
+        Sample the indices of `block` batches, batch `j` has the `j`-th index of the `block` ones found in each of
+        `size` equal segments of the priorities
+
+        Args:
+            size: number of indices of each batch
+        """
+
+        n = size * self.block
+        total = self.tree.total
+        values = np.random.random(n)
+        values += np.arange(n, dtype=np.float64)
+        idx = self.tree.find(values * (total / n))
+        probabilities = self.tree.priorities(idx) / total
+        self.block_indices = idx.reshape(size, self.block).T
+        self.block_probabilities = probabilities.reshape(size, self.block).T
+        self.row = 0
+
+    def sample_indices(self, size):
+        """
+        Sample indices of slots holding a transition, one in each of `size` equal segments of the priorities,
+        and keep the probabilities they were drawn with in `probabilities`
+
+        Args:
+            size: number of indices
+
+        Returns:
+            array of indices
+        """
+
+        if self.row >= len(self.block_indices) or self.block_indices.shape[1] != size:
+            self.sample_block(size)
+        idx = self.block_indices[self.row]
+        self.probabilities = self.block_probabilities[self.row]
+        self.row += 1
+
+        # slots found by rounding at the end of a segment, or emptied since the block was sampled
+        if np.count_nonzero(self.valid[idx]) < size:
+            idx = idx.copy()
+            replaced = ~self.valid[idx]
+            invalid = replaced
+            total = self.tree.total
+            while invalid.any():
+                idx[invalid] = self.tree.find(np.sort(np.random.random(np.count_nonzero(invalid))) * total)
+                invalid = ~self.valid[idx]
+            self.probabilities = self.probabilities.copy()
+            self.probabilities[replaced] = self.tree.priorities(idx[replaced]) / total
+        return idx
+
+    def update_priorities(self, td_errors, idx=None):
+        """
+        Update the priorities from TD errors
+
+        Args:
+            td_errors: array of TD errors of the batch
+            idx: indices of the batch (the last sampled one if None)
+        """
+
+        idx = self.indices if idx is None else idx
+        priorities = (np.abs(np.asarray(td_errors, dtype=np.float64)).reshape(-1) + self.eps) ** self.alpha
+        priorities[~self.valid[idx]] = 0.  # overwritten since sampled
+        self.tree.update(idx, priorities)
+        self.max_priority = max(self.max_priority, priorities.max())
+
+    def sample(self, size=256):
+        idx = self.sample_indices(size)
+        self.indices = idx
+
+        batch = self.gather(idx)
+        weights = (self.size * self.probabilities) ** -self.beta
+        batch["weights"] = (weights / weights.max()).astype(np.float32)[:, None]
+        return self.process(batch)
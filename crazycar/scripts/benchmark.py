@@ -0,0 +1,415 @@
+import math
+import pybullet
+import numpy as np
+
+from time import time
+from absl import app, flags, logging
+from pybullet_envs.bullet import bullet_client
+
+from crazycar.environments import Environment, VecEnvironment, KinematicEnvironment
+from crazycar.environments.track import Track
+from crazycar.environments.constants import RESET_MODES, ORIGIN
+from crazycar.agents import SensorAgent
+from crazycar.utils import time_per_call
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("bench", "vec_environment", "which benchmark to run")
+flags.DEFINE_integer("n_steps", 1000, "number of steps for each measurement")
+flags.DEFINE_integer("n_resets", 20, "number of resets for each measurement")
+flags.DEFINE_integer("map_id", 2, "map for the environment")
+
+logging.set_verbosity(logging.INFO)
+logging.get_absl_handler().setFormatter(None)
+
+POSITION = [2.4, 1, math.pi / 2]
+
+
+def bench_vec_environment():
+    """
+    Environment steps per second for a growing number of worker processes
+    """
+
+    env = Environment(map_id=FLAGS.map_id)
+    env.insert_car(SensorAgent, POSITION)
+    env.reset()
+    acts = np.array([[1., 0.]])
+
+    logging.info(f"|Environment| {1 / time_per_call(lambda: env.step(acts), FLAGS.n_steps):.1f} steps/sec")
+
+    for n_envs in [1, 2, 4, 8, 16, 32]:
+        vec_env = VecEnvironment(n_envs, map_id=FLAGS.map_id)
+        vec_env.insert_car(SensorAgent, POSITION)
+        vec_env.reset()
+        acts = np.tile(np.array([[[1., 0.]]]), (n_envs, 1, 1))
+
+        steps = n_envs / time_per_call(lambda: vec_env.step(acts), FLAGS.n_steps)
+        logging.info(f"|VecEnvironment n_envs={n_envs}| {steps:.1f} steps/sec")
+        vec_env.close()
+
+
+def bench_auto_reset():
+    """
+    Environment steps per second of the workers with the blocking reset of the finished environments
+    by the caller against the auto reset overlapped with the next steps
+    """
+
+    for reset_mode in RESET_MODES:
+        for auto_reset in [False, True]:
+            vec_env = VecEnvironment(4, map_id=FLAGS.map_id, reset_mode=reset_mode, auto_reset=auto_reset)
+            vec_env.insert_car(SensorAgent, POSITION)
+            vec_env.reset()
+            # different steering, so the environments crash at different steps
+            acts = np.array([[[1., -0.3]], [[1., 0.3]], [[1., -0.5]], [[1., 0.5]]])
+
+            n_dones = 0
+            ts = time()
+            for _ in range(FLAGS.n_steps):
+                _, _, done, _ = vec_env.step(acts)
+                n_dones += done.sum()
+                if not auto_reset and done.any():
+                    vec_env.reset(np.flatnonzero(done))
+            steps = 4 * FLAGS.n_steps / (time() - ts)
+            logging.info(f"|reset_mode={reset_mode} auto_reset={auto_reset}| {steps:.1f} steps/sec, "
+                         f"{n_dones} episodes")
+            vec_env.close()
+
+
+def bench_reset():
+    """
+    Reset latency for each reset mode
+    """
+
+    for reset_mode in RESET_MODES:
+        env = Environment(map_id=FLAGS.map_id, reset_mode=reset_mode)
+        env.insert_car(SensorAgent, POSITION)
+        env.reset()
+
+        latency = []
+        for _ in range(FLAGS.n_resets):
+            env.step(np.array([[1., 0.]]))
+            env.reset()
+            latency.append(env.reset_latency)
+        logging.info(f"|reset_mode={reset_mode}| {np.mean(latency) * 1e3:.3f} ms/reset")
+
+
+def bench_sensor():
+    """
+    Time of the sensor with and without the debug rays
+    """
+
+    env = Environment(map_id=FLAGS.map_id)
+    env.insert_car(SensorAgent, POSITION)
+    env.reset()
+    car = env.cars[0]
+
+    headless = time_per_call(car.get_sensor, FLAGS.n_steps)
+
+    car.debug = True
+    car.add_sensor()
+
+    debug = time_per_call(car.get_sensor, FLAGS.n_steps)
+
+    logging.info(f"|sensor debug| {debug * 1e6:.1f} us/step")
+    logging.info(f"|sensor headless| {headless * 1e6:.1f} us/step (saving {(debug - headless) * 1e6:.1f} us/step)")
+
+
+def bench_bullet_calls():
+    """
+    Number of Bullet calls for each step with and without the pose cache
+    """
+
+    env = Environment(map_id=FLAGS.map_id, count_calls=True)
+    env.insert_car(SensorAgent, POSITION)
+    env.reset()
+    acts = np.array([[1., 0.]])
+
+    for pose_cache in [False, True]:
+        env.cars[0].pose_cache = pose_cache
+        env.step(acts)
+        _, _, _, info = env.step(acts)
+        logging.info(f"|pose_cache={pose_cache}| {env.p.total} calls/step: {info['bullet_calls']}")
+
+
+def bench_actuation():
+    """
+    Time to apply the actions of every car, one call per joint against the batched commands
+    """
+
+    for n_cars in [1, 8, 32]:
+        env = Environment(map_id=FLAGS.map_id)
+        for _ in range(n_cars):
+            env.insert_car(SensorAgent, POSITION)
+        env.reset()
+        acts = np.tile(np.array([[1., 0.]]), (n_cars, 1))
+
+        def per_joint():
+            for car, act in zip(env.cars, acts):
+                speed, angle = act
+                for motor in car.motorizedwheels:
+                    env.p.setJointMotorControl2(car.racecarUniqueId, motor, env.p.VELOCITY_CONTROL,
+                                                targetVelocity=speed * car.speedMultiplier, force=car.maxForce)
+                for steer in car.steeringLinks:
+                    env.p.setJointMotorControl2(car.racecarUniqueId, steer, env.p.POSITION_CONTROL,
+                                                targetPosition=angle * car.steeringMultiplier)
+                x, y, _ = car.get_coordinate()
+                car.atGoal |= 2.1 <= x <= 2.9 and 0.9 <= y <= 1
+
+        old = time_per_call(per_joint, FLAGS.n_steps)
+        new = time_per_call(lambda: env.apply_actions(acts), FLAGS.n_steps)
+        logging.info(f"|actuation n_cars={n_cars}| per joint: {old * 1e6:.1f} us/step, "
+                     f"batched: {new * 1e6:.1f} us/step ({old / new:.1f}x)")
+
+
+def bench_lidar():
+    """
+    Time of the distance sensors of every car, one rayTestBatch for each car against one for all cars
+    """
+
+    for n_rays in [7, 64, 360]:
+        for n_cars in [1, 8, 32]:
+            env = Environment(map_id=FLAGS.map_id, n_rays=n_rays, sensor_fov=360 if n_rays > 64 else 180,
+                              done_mode="car")
+            for _ in range(n_cars):
+                env.insert_car(SensorAgent, POSITION)
+            env.reset()
+            env.step(np.tile(np.array([[1., 0.]]), (n_cars, 1)))
+
+            def per_car():
+                for car in env.cars:
+                    car.sensor_values = None
+                    car.get_sensor()
+
+            old = time_per_call(per_car, FLAGS.n_steps)
+            new = time_per_call(env.test_sensors, FLAGS.n_steps)
+            logging.info(f"|lidar n_rays={n_rays} n_cars={n_cars}| per car: {old * 1e3:.3f} ms/step, "
+                         f"batched: {new * 1e3:.3f} ms/step ({old / new:.1f}x)")
+
+
+def bench_collision():
+    """
+    Time of the collision check for every car, AABB overlap vs contact points
+    """
+
+    for n_cars in [1, 8, 32]:
+        env = Environment(map_id=FLAGS.map_id)
+        for _ in range(n_cars):
+            env.insert_car(SensorAgent, POSITION)
+        env.reset()
+        env.step(np.tile(np.array([[1., 0.]]), (n_cars, 1)))
+
+        aabb = time_per_call(lambda: [car.is_collision_aabb() for car in env.cars], FLAGS.n_steps)
+        contact = time_per_call(env.get_collision, FLAGS.n_steps)
+        logging.info(f"|collision n_cars={n_cars}| aabb: {aabb * 1e6:.1f} us/step, "
+                     f"contact: {contact * 1e6:.1f} us/step ({aabb / contact:.1f}x)")
+
+
+def bench_track():
+    """
+    Time to load the track file and to spawn the track
+    """
+
+    load = time_per_call(lambda: Track(FLAGS.map_id), FLAGS.n_resets)
+
+    track = Track(FLAGS.map_id)
+    p = bullet_client.BulletClient(connection_mode=pybullet.DIRECT)
+
+    def spawn():
+        p.resetSimulation()
+        track.build(p, ORIGIN)
+
+    build = time_per_call(spawn, FLAGS.n_resets)
+
+    logging.info(f"|track| load (cached): {load * 1e3:.3f} ms, build: {build * 1e3:.3f} ms")
+
+
+def bench_ray_caster():
+    """
+    Time and error of the analytic sensor against the Bullet ray test
+    """
+
+    for n_cars in [1, 8, 32]:
+        timings = {}
+        for sensor_backend in ["bullet", "analytic"]:
+            env = Environment(map_id=FLAGS.map_id, sensor_backend=sensor_backend)
+            for _ in range(n_cars):
+                env.insert_car(SensorAgent, POSITION)
+            env.reset()
+            env.step(np.tile(np.array([[1., 0.]]), (n_cars, 1)))
+
+            def observe():
+                for car in env.cars:
+                    car.clear_cache()
+                env.get_obs()
+
+            timings[sensor_backend] = time_per_call(observe, FLAGS.n_steps)
+
+        logging.info(f"|ray_caster n_cars={n_cars}| bullet: {timings['bullet'] * 1e6:.1f} us/step, "
+                     f"analytic: {timings['analytic'] * 1e6:.1f} us/step "
+                     f"({timings['bullet'] / timings['analytic']:.1f}x)")
+
+    # the links of the car are moved by Bullet at the start of the next step,
+    # so the Bullet ray test sees the pose of the previous step
+    env = Environment(map_id=FLAGS.map_id, sensor_backend="analytic")
+    env.insert_car(SensorAgent, POSITION)
+    env.reset()
+    car = env.cars[0]
+    rng = np.random.default_rng(0)
+
+    errors = []
+    previous = None
+    for _ in range(FLAGS.n_steps):
+        _, _, done, _ = env.step(np.array([[1., rng.uniform(-1, 1)]]))
+        analytic = car.get_sensor()
+        car.sensor_values = None
+        if previous is not None:
+            errors.append(np.abs(car.get_sensor() - previous))
+        previous = analytic
+        if done[0]:
+            env.reset()
+            previous = None
+
+    errors = np.concatenate(errors)
+    logging.info(f"|ray_caster error| mean: {errors.mean():.4f}, p99: {np.percentile(errors, 99):.4f}, "
+                 f"max: {errors.max():.4f}")
+
+
+def bench_kinematic():
+    """
+    Car steps per second of the kinematic model against Bullet
+    """
+
+    env = Environment(map_id=FLAGS.map_id)
+    env.insert_car(SensorAgent, POSITION)
+    env.reset()
+    acts = np.array([[1., 0.]])
+
+    bullet = 1 / time_per_call(lambda: env.step(acts), FLAGS.n_steps)
+    logging.info(f"|Environment| {bullet:.1f} car steps/sec")
+
+    for n_cars in [1, 64, 1024, 4096]:
+        env = KinematicEnvironment(map_id=FLAGS.map_id)
+        for _ in range(n_cars):
+            env.insert_car(SensorAgent, POSITION)
+        env.reset()
+        # slow enough to not crash during the measurement
+        acts = np.tile(np.array([[0.1, 0.]]), (n_cars, 1))
+
+        kinematic = n_cars / time_per_call(lambda: env.step(acts), max(FLAGS.n_steps * 16 // n_cars, 10))
+        logging.info(f"|KinematicEnvironment n_cars={n_cars}| {kinematic:.1f} car steps/sec "
+                     f"({kinematic / bullet:.1f}x)")
+
+
+def bench_ghost_cars():
+    """
+    Car steps per second with many independent cars in one Bullet world (done_mode="car")
+    """
+
+    base = None
+    for n_cars in [1, 4, 16, 64]:
+        env = Environment(map_id=FLAGS.map_id, done_mode="car", obs_mode="array")
+        for position in env.spawn_positions(n_cars):
+            env.insert_car(SensorAgent, position)
+        env.reset()
+        rng = np.random.default_rng(0)
+
+        def step():
+            env.step(np.stack([np.ones(n_cars), rng.uniform(-1, 1, n_cars)], axis=-1))
+
+        car_steps = n_cars / time_per_call(step, max(FLAGS.n_steps // n_cars, 10))
+        base = base or car_steps
+        logging.info(f"|done_mode=car n_cars={n_cars}| {car_steps:.1f} car steps/sec ({car_steps / base:.1f}x), "
+                     f"{env.n_episodes} episodes")
+
+
+def bench_info():
+    """
+    Time of a step with the information of the cars (computed at the latest at the next step)
+    and without it (info_keys=())
+    """
+
+    for n_cars in [1, 8]:
+        times = {}
+        for info_keys in [None, ()]:
+            env = Environment(map_id=FLAGS.map_id, sensor_backend="analytic", info_keys=info_keys)
+            for _ in range(n_cars):
+                env.insert_car(SensorAgent, POSITION)
+            env.reset()
+            acts = np.tile(np.array([[0.1, 0.]]), (n_cars, 1))
+
+            times[info_keys] = time_per_call(lambda: env.step(acts), FLAGS.n_steps)
+        logging.info(f"|info n_cars={n_cars}| all keys: {times[None] * 1e3:.3f} ms/step, "
+                     f"info_keys=(): {times[()] * 1e3:.3f} ms/step ({times[None] / times[()]:.2f}x)")
+
+
+def bench_obs_mode():
+    """
+    Time of a step with the observations batched into one array per key,
+    for a list of dictionaries (stacked by the caller) against the preallocated arrays
+    """
+
+    def stack(obs):
+        return {key: np.concatenate([o[key] for o in obs]) for key in obs[0]}
+
+    for n_cars in [1, 8]:
+        times = {}
+        for obs_mode in ["list", "array"]:
+            env = Environment(map_id=FLAGS.map_id, sensor_backend="analytic", obs_mode=obs_mode)
+            for _ in range(n_cars):
+                env.insert_car(SensorAgent, POSITION)
+            env.reset()
+            acts = np.tile(np.array([[0.1, 0.]]), (n_cars, 1))
+
+            ts = time()
+            for _ in range(FLAGS.n_steps):
+                obs, rew, done, _ = env.step(acts)
+                if obs_mode == "list":
+                    obs, rew, done = stack(obs), np.array(rew, dtype=np.float32)[:, 0], np.array(done * n_cars)
+            times[obs_mode] = (time() - ts) / FLAGS.n_steps
+        logging.info(f"|Environment n_cars={n_cars}| list: {times['list'] * 1e3:.2f} ms/step, "
+                     f"array: {times['array'] * 1e3:.2f} ms/step ({times['list'] / times['array']:.1f}x)")
+
+    for n_cars in [64, 1024]:
+        times = {}
+        for obs_mode in ["list", "array"]:
+            env = KinematicEnvironment(map_id=FLAGS.map_id, obs_mode=obs_mode)
+            for _ in range(n_cars):
+                env.insert_car(SensorAgent, POSITION)
+            env.reset()
+            acts = np.tile(np.array([[0.1, 0.]]), (n_cars, 1))
+
+            n_steps = max(FLAGS.n_steps * 16 // n_cars, 10)
+            ts = time()
+            for _ in range(n_steps):
+                obs, rew, done, _ = env.step(acts)
+                if obs_mode == "list":
+                    obs, rew, done = stack(obs), np.array(rew, dtype=np.float32)[:, 0], np.array(done * n_cars)
+            times[obs_mode] = (time() - ts) / n_steps
+        logging.info(f"|KinematicEnvironment n_cars={n_cars}| list: {times['list'] * 1e3:.2f} ms/step, "
+                     f"array: {times['array'] * 1e3:.2f} ms/step ({times['list'] / times['array']:.1f}x)")
+
+
+BENCHMARKS = {
+    "vec_environment": bench_vec_environment,
+    "reset": bench_reset,
+    "auto_reset": bench_auto_reset,
+    "sensor": bench_sensor,
+    "bullet_calls": bench_bullet_calls,
+    "actuation": bench_actuation,
+    "lidar": bench_lidar,
+    "collision": bench_collision,
+    "track": bench_track,
+    "ray_caster": bench_ray_caster,
+    "kinematic": bench_kinematic,
+    "ghost_cars": bench_ghost_cars,
+    "obs_mode": bench_obs_mode,
+    "info": bench_info,
+}
+
+
+def main(_):
+    BENCHMARKS[FLAGS.bench]()
+
+
+if __name__ == "__main__":
+    app.run(main)
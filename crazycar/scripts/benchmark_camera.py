@@ -0,0 +1,145 @@
+import math
+import numpy as np
+
+from absl import app, flags, logging
+
+from crazycar.environments import Environment
+from crazycar.agents import ImageAgent
+from crazycar.agents.constants import CAMERA_WIDTH, CAMERA_HEIGHT
+from crazycar.utils import rgba2rgb, rgb2gray, rgba2gray, time_per_call
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("bench", "camera", "which benchmark to run")
+flags.DEFINE_integer("n_steps", 1000, "number of steps for each measurement")
+flags.DEFINE_integer("map_id", 2, "map for the environment")
+
+logging.set_verbosity(logging.INFO)
+logging.get_absl_handler().setFormatter(None)
+
+POSITION = [2.4, 1, math.pi / 2]
+
+
+def bench_camera():
+    """
+    Frames per second of the Bullet camera against the software renderer, and error of the software images
+    """
+
+    env = Environment(map_id=FLAGS.map_id)
+    env.insert_car(ImageAgent, POSITION)
+    env.reset()
+    car = env.cars[0]
+
+    def render():
+        # the environment stores the frame of the step in `camera_values`, drop it to render again
+        car.camera_values = None
+        car.get_camera()
+
+    bullet = 1 / time_per_call(render, max(FLAGS.n_steps // 10, 10))
+    logging.info(f"|camera bullet| {bullet:.1f} frames/sec")
+
+    # all the cars at the same pose, Bullet is much slower in this case (cameras inside the other cars)
+    pose = np.array(car.get_camera_pose())
+    for n_cars in [1, 8, 64, 1024]:
+        poses = np.tile(pose, (n_cars, 1))
+        software = n_cars / time_per_call(lambda: env.renderer.render(poses), max(FLAGS.n_steps // n_cars, 10))
+        logging.info(f"|camera software n_cars={n_cars}| {software:.1f} frames/sec ({software / bullet:.1f}x)")
+
+    env = Environment(map_id=FLAGS.map_id, camera_backend="software")
+    env.insert_car(ImageAgent, POSITION)
+    env.reset()
+    rng = np.random.default_rng(0)
+
+    errors = []
+    for _ in range(FLAGS.n_steps):
+        obs, _, done, _ = env.step(np.array([[1., rng.uniform(-1, 1)]]))
+        car = env.cars[0]
+        car.camera_values = None
+        errors.append(np.abs(obs[0]["image"] - car.get_camera()))
+        if done[0]:
+            env.reset()
+
+    errors = np.concatenate(errors)
+    logging.info(f"|camera error| mean: {errors.mean():.2f} gray levels, "
+                 f"same pixel: {(errors < 1).mean() * 100:.1f}%")
+
+
+def bench_render_cache():
+    """
+    Hit rate and time of the Bullet camera with the render cache, for a slow random driver
+    """
+
+    for render_cache in [False, True]:
+        env = Environment(map_id=FLAGS.map_id, render_cache=render_cache)
+        env.insert_car(ImageAgent, POSITION)
+        env.reset()
+        rng = np.random.default_rng(0)
+
+        def step():
+            # stall half of the time
+            speed = rng.choice([0., 0.2])
+            _, _, done, _ = env.step(np.array([[speed, rng.uniform(-1, 1)]]))
+            if done[0]:
+                env.reset()
+
+        duration = time_per_call(step, FLAGS.n_steps)
+
+        if not render_cache:
+            logging.info(f"|render_cache=False| {duration * 1e3:.3f} ms/step")
+            continue
+        info = env.render_cache.get_info()
+
+        # error of a cached frame against a fresh one
+        car = env.cars[0]
+        errors = []
+        for _ in range(20):
+            env.step(np.array([[0., 0.]]))
+            car.camera_values = None  # the frame of the step, not read from the cache
+            cached = car.get_camera()
+            car.render_cache = None
+            errors.append(np.abs(cached - car.get_camera()).mean())
+            car.render_cache = env.render_cache
+
+        logging.info(f"|render_cache=True| {duration * 1e3:.3f} ms/step, {info}, "
+                     f"error of a cached frame: {np.mean(errors):.2f} gray levels")
+
+
+def bench_camera_pipeline():
+    """
+    Time of the conversion of the raw Bullet images to the gray observations,
+    one image at a time (old pipeline) against one batch in a preallocated buffer
+    """
+
+    env = Environment(map_id=FLAGS.map_id)
+    env.insert_car(ImageAgent, POSITION)
+    env.reset()
+    raw = env.cars[0].get_camera_rgba()
+
+    def old_pipeline(batch):
+        return [np.array([np.expand_dims(
+            rgb2gray(rgba2rgb(np.array(image).reshape((CAMERA_HEIGHT, CAMERA_WIDTH, 4)))), -1
+        )]) for image in batch]
+
+    for n_cars in [1, 8, 64]:
+        batch = np.tile(raw, (n_cars, 1, 1, 1))
+        out = np.empty((n_cars, 1, CAMERA_HEIGHT, CAMERA_WIDTH, 1), dtype=np.float32)
+
+        old = time_per_call(lambda: old_pipeline(batch), FLAGS.n_steps)
+        new = time_per_call(lambda: rgba2gray(batch, out=out[:, 0, :, :, 0]), FLAGS.n_steps)
+        logging.info(f"|camera pipeline n_cars={n_cars}| old: {old * 1e6:.1f} us/step, "
+                     f"batched: {new * 1e6:.1f} us/step ({old / new:.1f}x)")
+
+
+BENCHMARKS = {
+    "camera": bench_camera,
+    "render_cache": bench_render_cache,
+    "camera_pipeline": bench_camera_pipeline,
+}
+
+
+def main(_):
+    BENCHMARKS[FLAGS.bench]()
+
+
+if __name__ == "__main__":
+    app.run(main)
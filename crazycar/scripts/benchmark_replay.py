@@ -0,0 +1,261 @@
+import sys
+import math
+import numpy as np
+
+from time import time
+from itertools import islice, cycle
+from absl import app, flags, logging
+
+from crazycar.environments import Environment
+from crazycar.agents import ImageAgent
+from crazycar.agents.constants import CAMERA_SHAPE, SENSOR_SHAPE
+from crazycar.utils import time_per_call
+from crazycar.replay import ReplayBuffer, MemmapReplayBuffer, PrioritizedReplayBuffer, SumTree
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("bench", "replay", "which benchmark to run")
+flags.DEFINE_integer("n_steps", 1000, "number of steps for each measurement")
+flags.DEFINE_integer("map_id", 2, "map for the environment")
+
+logging.set_verbosity(logging.INFO)
+logging.get_absl_handler().setFormatter(None)
+
+POSITION = [2.4, 1, math.pi / 2]
+BATCH_SIZE = 256
+# samples/ms of the prioritized replay aimed at
+SAMPLING_TARGET = 10000
+
+
+def trajectory(rng, episode_length=1000, image=False):
+    """
+    Random transitions of a `SensorAgent` (or an `ImageAgent`) in the format of the training scripts,
+    each one continues the observation of the previous one until the end of its episode
+
+    Args:
+        rng: random generator
+        episode_length: number of transitions of each episode
+        image: add camera frames in [0, 255]
+
+    Returns:
+        endless generator of transitions
+    """
+
+    def random_obs():
+        if image:
+            return {"sensor": rng.random((1, ) + SENSOR_SHAPE), "image": 255 * rng.random((1, ) + CAMERA_SHAPE)}
+        return {"sensor": rng.random((1, ) + SENSOR_SHAPE)}
+
+    obs = random_obs()
+    step = 0
+    while True:
+        step += 1
+        done = step % episode_length == 0
+        next_obs = random_obs()
+        yield {"obs": obs, "act": rng.uniform(-1, 1, 1), "next_obs": next_obs, "rew": [rng.random()], "done": [done]}
+        obs = random_obs() if done else next_obs
+
+
+def fill(rb, transitions, n):
+    """
+    Store transitions into a replay
+
+    Args:
+        rb: replay buffer
+        transitions: iterator of transitions
+        n: number of transitions to store
+    """
+
+    for transition in islice(transitions, n):
+        rb.store(transition)
+
+
+def bench_replay():
+    """
+    Sampling latency of the replay as it fills, the old deque of dictionaries against the ring buffers
+    """
+
+    from collections import deque
+
+    def old_sample(data, size):
+        idx = list(range(len(data)))
+        np.random.shuffle(idx)
+        idx = idx[:size]
+        tmp = np.array(data)[idx]
+        return {
+            "obs": {"sensor": np.concatenate([el["obs"]["sensor"] for el in tmp]).astype(np.float32)},
+            "act": np.concatenate([np.expand_dims(el["act"], axis=0) for el in tmp]).astype(np.float32),
+            "next_obs": {"sensor": np.concatenate([el["next_obs"]["sensor"] for el in tmp]).astype(np.float32)},
+            "rew": np.expand_dims(np.concatenate([el["rew"] for el in tmp]), axis=-1).astype(np.float32),
+            "done": np.expand_dims(np.concatenate([el["done"] for el in tmp]), axis=-1).astype(np.float32),
+        }
+
+    data = deque(maxlen=int(1e6))
+    rb = ReplayBuffer(int(1e6))
+    transitions = trajectory(np.random.default_rng(0))
+
+    n_samples = 20
+    for size in [int(1e3), int(1e4), int(1e5), int(1e6)]:
+        for transition in islice(transitions, size - len(data)):
+            data.append(transition)
+            rb.store(transition)
+
+        old = time_per_call(lambda: old_sample(data, BATCH_SIZE), n_samples)
+        new = time_per_call(lambda: rb.sample(BATCH_SIZE), n_samples)
+        logging.info(f"|replay size={size}| deque: {old * 1e3:.3f} ms/sample, "
+                     f"ring buffers: {new * 1e3:.3f} ms/sample ({old / new:.0f}x)")
+
+
+def bench_replay_memory():
+    """
+    Memory of a full replay of `ImageAgent` transitions, each observation stored once against obs and next_obs
+    """
+
+    rng = np.random.default_rng(0)
+    maxlen = int(1e5)
+    for episode_length in [10, 100, 1000]:
+        rb = ReplayBuffer(maxlen)
+        fill(rb, trajectory(rng, episode_length, image=True), maxlen)
+
+        frames = sum(array.nbytes for array in rb.frames.values())
+        fields = sum(array.nbytes for array in rb.fields.values())
+        duplicated = 2 * frames + fields  # obs and next_obs arrays of `maxlen` transitions
+        logging.info(f"|replay memory episode_length={episode_length}| "
+                     f"obs and next_obs: {duplicated / 2 ** 20:.1f} MB, "
+                     f"stored once: {rb.nbytes / 2 ** 20:.1f} MB ({duplicated / rb.nbytes:.2f}x) "
+                     f"for {len(rb)} transitions ({len(rb) / maxlen:.1%} of the slots)")
+
+
+def bench_replay_images():
+    """
+    Memory and sampling latency of a replay of camera frames stored as float32, uint8 and zlib compressed uint8
+    """
+
+    env = Environment(map_id=FLAGS.map_id)
+    env.insert_car(ImageAgent, POSITION)
+    rng = np.random.default_rng(0)
+
+    # real frames of a few episodes with random steering
+    transitions = []
+    obs = env.reset()
+    for _ in range(FLAGS.n_steps):
+        act = np.array([[1., rng.uniform(-1, 1)]])
+        next_obs, rew, done, _ = env.step(act)
+        transitions.append({"obs": obs[0], "act": act[0], "next_obs": next_obs[0], "rew": rew[0], "done": done})
+        obs = env.reset() if done[0] else next_obs
+
+    maxlen = int(1e5)
+    for name, compress in [("uint8", 0), ("zlib", 1)]:
+        rb = ReplayBuffer(maxlen, compress=compress)
+        fill(rb, cycle(transitions), maxlen)
+
+        image = rb.frames["image"]
+        stored = image.nbytes + sum(sys.getsizeof(frame) for frame in image) if compress else image.nbytes
+        float32 = maxlen * np.prod(CAMERA_SHAPE) * 4
+
+        sample = time_per_call(lambda: rb.sample(BATCH_SIZE), 100)
+        logging.info(f"|replay images {name}| float32: {float32 / 2 ** 20:.1f} MB, {name}: {stored / 2 ** 20:.1f} MB "
+                     f"({float32 / stored:.1f}x) for {maxlen} frames, {sample * 1e3:.3f} ms/sample")
+
+
+def bench_replay_memmap():
+    """
+    Storing, sampling and reopening the memory-mapped replay against the in-memory one, with image transitions
+    """
+
+    import shutil
+    import tempfile
+
+    maxlen = int(1e6)
+    transitions = list(islice(trajectory(np.random.default_rng(0), 100, image=True), 1000))
+
+    path = tempfile.mkdtemp()
+    try:
+        for name, rb in [("memory", ReplayBuffer(maxlen)), ("memmap", MemmapReplayBuffer(path, maxlen))]:
+            repeated = cycle(transitions)
+            store = time_per_call(lambda: rb.store(next(repeated)), maxlen)
+            sample = time_per_call(lambda: rb.sample(BATCH_SIZE), 100)
+            logging.info(f"|replay {name} size={maxlen}| store: {store * 1e6:.1f} us/transition, "
+                         f"sample: {sample * 1e3:.3f} ms/sample")
+
+        ts = time()
+        rb.flush()
+        flush = time() - ts
+        ts = time()
+        rb = MemmapReplayBuffer(path)
+        reopen = time() - ts
+        rb.sample(BATCH_SIZE)
+        logging.info(f"|replay memmap snapshot| flush: {flush:.2f} s, reopen: {reopen * 1e3:.1f} ms "
+                     f"for {len(rb)} transitions")
+    finally:
+        shutil.rmtree(path)
+
+
+def bench_prioritized():
+    """
+    Stratified sampling and priority updates of the sum tree at 1e6 capacity, sampling of the prioritized replay
+    by blocks of batches, and the prioritized replay against the uniform one
+    """
+
+    rng = np.random.default_rng(0)
+    capacity = int(1e6)
+    tree = SumTree(capacity)
+    tree.update(np.arange(capacity), rng.random(capacity))
+
+    n_samples = 20
+    for size in [256, 4096, 65536]:
+        sample = time_per_call(lambda: tree.find((np.arange(size) + rng.random(size)) * (tree.total / size)),
+                               n_samples)
+        idx = rng.integers(0, capacity, size)
+        priorities = rng.random(size)
+        update = time_per_call(lambda: tree.update(idx, priorities), n_samples)
+        logging.info(f"|sum tree capacity={capacity} batch={size}| sample: {size / sample / 1e3:.0f} samples/ms, "
+                     f"update: {size / update / 1e3:.0f} updates/ms")
+
+    rb = PrioritizedReplayBuffer(capacity)
+    fill(rb, trajectory(rng), capacity)
+    idx = np.flatnonzero(rb.valid)
+    rb.update_priorities(rng.standard_normal(len(idx)), idx)
+    for block in [1, 64, 256, 1024]:
+        rb.block = block
+
+        def sample_block():
+            rb.sample_block(BATCH_SIZE)
+            for _ in range(block):
+                rb.sample_indices(BATCH_SIZE)
+
+        sample = time_per_call(sample_block, 4) / block
+        rate = BATCH_SIZE / sample / 1e3
+        logging.info(f"|prioritized replay size={capacity} batch={BATCH_SIZE} block={block}| "
+                     f"sample: {rate:.0f} samples/ms ({rate / SAMPLING_TARGET:.0%} of the target of {SAMPLING_TARGET})")
+
+    maxlen = int(1e5)
+    times = {}
+    for name, rb in [("uniform", ReplayBuffer(maxlen)), ("prioritized", PrioritizedReplayBuffer(maxlen))]:
+        fill(rb, trajectory(rng), maxlen)
+
+        def sample():
+            rb.sample(BATCH_SIZE)
+            if name == "prioritized":
+                rb.update_priorities(rng.standard_normal(BATCH_SIZE))
+
+        times[name] = time_per_call(sample, 2048)  # two blocks of the prioritized replay
+    logging.info(f"|replay size={maxlen}| uniform: {times['uniform'] * 1e3:.3f} ms/sample, prioritized: "
+                 f"{times['prioritized'] * 1e3:.3f} ms/sample and update")
+
+
+BENCHMARKS = {
+    "replay": bench_replay,
+    "replay_memory": bench_replay_memory,
+    "replay_images": bench_replay_images,
+    "replay_memmap": bench_replay_memmap,
+    "prioritized": bench_prioritized,
+}
+
+
+def main(_):
+    BENCHMARKS[FLAGS.bench]()
+
+
+if __name__ == "__main__":
+    app.run(main)
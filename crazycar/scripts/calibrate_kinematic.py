@@ -0,0 +1,48 @@
+import math
+import numpy as np
+
+from absl import app, flags, logging
+
+from crazycar.environments.kinematic import KinematicEnvironment, record_trajectories, calibrate
+from crazycar.agents import SensorAgent
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer("map_id", 1, "map for the environment")
+flags.DEFINE_integer("n_episodes", 30, "number of recorded Bullet episodes")
+flags.DEFINE_integer("hold", 20, "number of steps to hold each random action")
+flags.DEFINE_integer("seed", 0, "random seed")
+
+logging.set_verbosity(logging.INFO)
+logging.get_absl_handler().setFormatter(None)
+
+POSITION = [2.4, 1, math.pi / 2]
+
+
+def main(_):
+    trajectories = record_trajectories(map_id=FLAGS.map_id, position=POSITION, n_episodes=FLAGS.n_episodes,
+                                       hold=FLAGS.hold, seed=FLAGS.seed)
+    logging.info(f"|record| {len(trajectories)} episodes, {sum(len(acts) for _, acts in trajectories)} steps")
+
+    params = calibrate(trajectories)
+    logging.info(f"|calibrate| {params}")
+
+    # replay the actions of Bullet open loop and compare the positions
+    env = KinematicEnvironment(map_id=FLAGS.map_id, params=params)
+    env.insert_car(SensorAgent, POSITION)
+
+    errors = {25: [], 50: [], 100: []}
+    for poses, acts in trajectories:
+        env.reset()
+        for t, act in enumerate(acts, 1):
+            env.step(act[None])
+            if t in errors:
+                errors[t].append(np.hypot(*(env.pose[0, :2] - poses[t, :2])))
+
+    for t, error in errors.items():
+        if error:
+            logging.info(f"|drift after {t} steps| {np.mean(error) * 100:.1f} cm ({len(error)} episodes)")
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,135 @@
+import math
+import numpy as np
+
+from absl import app, flags, logging
+
+from crazycar.environments import Environment
+from crazycar.agents import SensorAgent
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("check", "all", "which check to run (all to run every check)")
+flags.DEFINE_integer("map_id", 2, "map for the environment")
+
+logging.set_verbosity(logging.INFO)
+logging.get_absl_handler().setFormatter(None)
+
+POSITIONS = [[2.4, 1, math.pi / 2], [2.5, 6, math.pi]]
+ACTIONS = np.array([[1., .5], [1., -.3]])
+TOLERANCE = 1e-6
+# error of the analytic distance sensors against Bullet (fraction of the range), rays that graze a corner
+# of the walls differ a little more than the others
+SENSOR_TOLERANCE = 1e-2
+SENSOR_MEAN_TOLERANCE = 1e-4
+
+
+def reset_observations(reset_mode, n_episodes=3, n_steps=50):
+    """
+    Sensor observations after each reset, driving the cars between the resets
+
+    Args:
+        reset_mode: how to reset the environment
+        n_episodes: number of resets
+        n_steps: number of steps before the next reset
+
+    Returns:
+        list of array shape(n_cars, n_sensors) for each reset
+    """
+
+    env = Environment(map_id=FLAGS.map_id, reset_mode=reset_mode)
+    for position in POSITIONS:
+        env.insert_car(SensorAgent, position)
+
+    observations = []
+    for _ in range(n_episodes):
+        obs = env.reset()
+        observations.append(np.concatenate([o["sensor"] for o in obs]))
+        for _ in range(n_steps):
+            env.step(ACTIONS)
+    return observations
+
+
+def check_reset_modes():
+    """
+    Every reset mode gives the observations of a rebuilt world
+    """
+
+    expected = reset_observations("rebuild")
+    for reset_mode in ["snapshot", "respawn"]:
+        for episode, obs in enumerate(reset_observations(reset_mode)):
+            error = np.abs(obs - expected[episode]).max()
+            assert error <= TOLERANCE, f"{reset_mode} reset {episode} differs from rebuild by {error}"
+        logging.info(f"|reset_mode={reset_mode}| same observations as rebuild")
+
+
+def check_car_respawn(n_steps=500):
+    """
+    In the "car" done mode, a finished car starts its next episode with the observation of a fresh spawn
+    """
+
+    env = Environment(map_id=FLAGS.map_id, done_mode="car")
+    for position in POSITIONS:
+        env.insert_car(SensorAgent, position)
+    spawn = [o["sensor"] for o in env.reset()]
+
+    # full steering, the cars hit the walls quickly
+    acts = np.array([[1., 1.], [1., -1.]])
+    n_respawns = 0
+    for _ in range(n_steps):
+        obs, _, done, _ = env.step(acts)
+        for i in np.flatnonzero(done):
+            error = np.abs(obs[i]["sensor"] - spawn[i]).max()
+            assert error <= TOLERANCE, f"car {i} respawned with an observation {error} from its spawn"
+            n_respawns += 1
+    assert n_respawns > 0, "no car finished its episode"
+    logging.info(f"|done_mode=car| {n_respawns} respawns with the observations of the spawn")
+
+
+def check_sensor_backends(n_steps=1000):
+    """
+    The analytic distance sensors agree with the Bullet ray test at the same state of the cars
+    """
+
+    for n_rays in [7, 360]:
+        env = Environment(map_id=FLAGS.map_id, n_rays=n_rays)
+        env.insert_car(SensorAgent, POSITIONS[0])
+        env.reset()
+        rng = np.random.default_rng(0)
+
+        errors = []
+        for _ in range(n_steps):
+            _, _, done, _ = env.step(np.array([[1., rng.uniform(-1, 1)]]))
+            car = env.cars[0]  # new car after each rebuild
+            env.cast_sensors()
+            analytic = car.sensor_values.copy()
+            env.test_sensors()
+            bullet = car.sensor_values
+
+            # Bullet gives 0 to the rays starting inside a body (crashed or bumping car)
+            if car.nCollision == 0:
+                errors.append(np.abs(analytic - bullet)[bullet > 0])
+            if done[0]:
+                env.reset()
+
+        errors = np.concatenate(errors)
+        assert errors.max() <= SENSOR_TOLERANCE, f"n_rays={n_rays}: analytic sensor {errors.max()} from Bullet"
+        assert errors.mean() <= SENSOR_MEAN_TOLERANCE, f"n_rays={n_rays}: mean error {errors.mean()}"
+        logging.info(f"|sensor_backend n_rays={n_rays}| analytic against Bullet, mean error: {errors.mean():.2e}, "
+                     f"max: {errors.max():.2e} over {len(errors)} rays")
+
+
+CHECKS = {
+    "reset_modes": check_reset_modes,
+    "car_respawn": check_car_respawn,
+    "sensor_backends": check_sensor_backends,
+}
+
+
+def main(_):
+    checks = CHECKS if FLAGS.check == "all" else {FLAGS.check: CHECKS[FLAGS.check]}
+    for check in checks.values():
+        check()
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,147 @@
+import numpy as np
+
+from absl import app, flags, logging
+
+from crazycar.agents.constants import SENSOR_SHAPE
+from crazycar.replay import PrioritizedReplayBuffer
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("check", "all", "which check to run (all to run every check)")
+
+logging.set_verbosity(logging.INFO)
+logging.get_absl_handler().setFormatter(None)
+
+MAXLEN = 1000
+# total variation distance of the sampled slots from the priorities
+DISTRIBUTION_TOLERANCE = 0.02
+
+
+def fill(rb, rng, n):
+    """
+    Store one episode of random sensor transitions into a replay
+
+    Args:
+        rb: replay
+        rng: random generator
+        n: number of transitions
+    """
+
+    obs = {"sensor": rng.random((1, ) + SENSOR_SHAPE)}
+    for _ in range(n):
+        next_obs = {"sensor": rng.random((1, ) + SENSOR_SHAPE)}
+        rb.store({"obs": obs, "act": rng.uniform(-1, 1, 1), "next_obs": next_obs, "rew": [rng.random()],
+                  "done": [False]})
+        obs = next_obs
+
+
+def filled_replay(rng, block):
+    """
+    Prioritized replay full of random sensor transitions, with random priorities
+
+    Args:
+        rng: random generator
+        block: number of batches sampled at once
+
+    Returns:
+        replay
+    """
+
+    rb = PrioritizedReplayBuffer(MAXLEN, block=block)
+    fill(rb, rng, 2 * MAXLEN)
+    idx = np.flatnonzero(rb.valid)
+    rb.update_priorities(rng.random(len(idx)), idx)
+    return rb
+
+
+def check_sampling(n_batches=4000, size=256):
+    """
+    The sampled slots follow the priorities, each batch has one slot in each segment of the priorities
+    and the importance weights of the probabilities
+    """
+
+    rng = np.random.default_rng(0)
+    for block in [1, 16]:
+        rb = filled_replay(rng, block)
+        np.random.seed(0)
+
+        counts = np.zeros(MAXLEN)
+        for _ in range(n_batches):
+            batch = rb.sample(size)
+            idx = rb.indices
+            assert np.all(np.diff(idx) >= 0), f"block={block}: batch not in the order of the segments"
+
+            weights = (len(rb) * rb.tree.priorities(idx) / rb.tree.total) ** -rb.beta
+            error = np.abs(batch["weights"][:, 0] - weights / weights.max()).max()
+            assert error <= 1e-6, f"block={block}: importance weights {error} from the priorities"
+            np.add.at(counts, idx, 1)
+
+        expected = rb.tree.priorities(np.arange(MAXLEN)) / rb.tree.total
+        distance = np.abs(counts / counts.sum() - expected).sum() / 2
+        assert distance <= DISTRIBUTION_TOLERANCE, f"block={block}: sampled slots {distance} from the priorities"
+        logging.info(f"|prioritized block={block}| {n_batches} batches of {size}, "
+                     f"distance from the priorities: {distance:.4f}")
+
+
+def check_update(model, n_updates=10, batch_size=32):
+    """
+    The prioritized `update_params` of a model gives finite losses and sets the priorities of each sampled batch
+
+    Args:
+        model: model with a prioritized replay
+        n_updates: number of updates
+        batch_size: batch size
+    """
+
+    fill(model.rb, np.random.default_rng(0), 4 * batch_size)
+    for i in range(n_updates):
+        metric = model.update_params(i, batch_size)
+        assert all(np.all(np.isfinite(value)) for value in metric.values()), f"update {i}: {metric}"
+
+        # the new transitions have the maximum priority 1
+        priorities = model.rb.tree.priorities(model.rb.indices)
+        assert np.all(priorities != 1.), f"update {i}: priorities of the batch not updated"
+    logging.info(f"|prioritized {model.__class__.__module__}| {n_updates} updates of a batch of {batch_size}")
+
+
+def check_sac_torch():
+    """
+    Prioritized updates of the PyTorch SAC (on the cuda device like the training)
+    """
+
+    from crazycar.algos_torch import SAC
+    from crazycar.algos_torch.encoder import Sensor
+    from crazycar.algos_torch.common import initial
+
+    initial()
+    check_update(SAC(Sensor, 1, replay_size=MAXLEN, prioritized=True))
+
+
+def check_sac_tf():
+    """
+    Prioritized updates of the TensorFlow SAC
+    """
+
+    from crazycar.algos_tf import SAC
+    from crazycar.algos_tf.encoder import Sensor
+    from crazycar.algos_tf.common import initial
+
+    initial()
+    check_update(SAC(Sensor, 1, replay_size=MAXLEN, prioritized=True))
+
+
+CHECKS = {
+    "sampling": check_sampling,
+    "sac_torch": check_sac_torch,
+    "sac_tf": check_sac_tf,
+}
+
+
+def main(_):
+    checks = CHECKS if FLAGS.check == "all" else {FLAGS.check: CHECKS[FLAGS.check]}
+    for check in checks.values():
+        check()
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -2,6 +2,7 @@ import math
 import numpy as np
 import tensorflow as tf
 
+from functools import partial
 from tqdm import tqdm
 from absl import app, flags
 
@@ -18,6 +19,8 @@ flags.DEFINE_integer("n_steps", int(1e6), "number of steps for training")
 flags.DEFINE_integer("start_steps", 1000, "number of steps for random action")
 flags.DEFINE_integer("batch_size", 256, "batch size")
 flags.DEFINE_integer("eval_steps", int(1e4), "number of steps for evaluation")
+flags.DEFINE_integer("n_rays", 7, "number of distance sensors")
+flags.DEFINE_boolean("prioritized", False, "prioritized experience replay")
 flags.DEFINE_string("name", None, "experiment name for logging")
 flags.mark_flag_as_required("name")
 
@@ -28,15 +31,16 @@ def main(_):
     initial()
 
     # define environment
-    env = Environment(map_id=2)
+    env = Environment(map_id=2, n_rays=FLAGS.n_rays, info_keys=())  # the info is not used
     agents = [SensorAgent]
     positions = [[2.4, 1, math.pi / 2]]
     # positions = [[2.5, 6, math.pi * 2 / 2]]
     for agent, pos in zip(agents, positions):
         env.insert_car(agent, pos)
 
-    # define models
-    models = [SAC(Sensor, 1)]
+    # define models, the encoder follows the number of distance sensors
+    _, shape_obs = env.sample_observation(with_shape=True)
+    models = [SAC(partial(Sensor, sensor_shape=shape_obs["sensor"][1:]), 1, prioritized=FLAGS.prioritized)]
     writers = [
         tf.summary.create_file_writer(f'./logs_tf/{FLAGS.name}/{model.__class__.__name__}-{idx}')
         for idx, model in enumerate(models)
@@ -4,6 +4,8 @@ from time import time
 from datetime import datetime
 from absl import logging
 from functools import wraps
+from collections import Counter
+from collections.abc import MutableMapping
 
 
 def get_observation_shape(x):
@@ -52,6 +54,40 @@ def rgb2gray(rgb):
     return np.dot(rgb[..., :3], [0.2989, 0.5870, 0.1140])
 
 
+# weights of `rgb2gray` in 1 / 10000
+GRAY_WEIGHTS_INT = np.array([2989, 5870, 1140], dtype=np.int32)
+
+
+def rgba2gray(rgba, out=None, background=(255, 255, 255)):
+    """
+    Alpha composite on the background and convert to gray with integer math,
+    same values as `rgb2gray(rgba2rgb(rgba))` for a batch of images
+
+    Args:
+        rgba: uint8 array shape(..., 4)
+        out: float32 array shape(...) to write into (new array if None)
+        background: rgb color of the background
+
+    Returns:
+        gray image in [0, 255]
+    """
+
+    if out is None:
+        out = np.empty(rgba.shape[:-1], dtype=np.float32)
+
+    rgb = rgba[..., :3].astype(np.int32)
+    alpha = rgba[..., 3:]
+    if not (alpha == 255).all():
+        alpha = alpha.astype(np.int32)
+        rgb *= alpha
+        rgb += (255 - alpha) * np.array(background, dtype=np.int32)
+        rgb //= 255
+
+    np.multiply(rgb @ GRAY_WEIGHTS_INT, np.float32(1e-4), out=out, casting="unsafe")
+
+    return out
+
+
 def evaluation(env, models, n_episode=10):
     """
     Evaluation the models
@@ -119,3 +155,122 @@ def timing(name, debug=False):
             return res
         return wrap_f
     return wrap
+
+
+def time_per_call(f, n_calls):
+    """
+    Average time of a function
+
+    Args:
+        f: function without argument
+        n_calls: number of calls
+
+    Returns:
+        seconds per call
+    """
+
+    ts = time()
+    for _ in range(n_calls):
+        f()
+    return (time() - ts) / n_calls
+
+
+class CallCounter:
+    """
+    Wrap the bullet client and count every call going through it
+
+    Args:
+        client: bullet client
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self.counts = Counter()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def wrap_f(*args, **kwargs):
+            self.counts[name] += 1
+            return attr(*args, **kwargs)
+        return wrap_f
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def reset(self):
+        """
+        Clear the counters
+        """
+
+        self.counts.clear()
+
+
+class LazyDict(MutableMapping):
+    """
+    Dictionary with values computed at the first access, from a function given by `set_lazy`
+
+    The functions read the current state, so the pending values are computed by `expire` before the state
+    changes (e.g. at the next step) and an old dictionary keeps them. Pickling computes every value.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._values = dict(*args, **kwargs)
+        self._lazy = {}
+
+    def set_lazy(self, key, f):
+        """
+        Set a value computed by `f()` at the first access
+        """
+
+        self._values.pop(key, None)
+        self._lazy[key] = f
+
+    def compute(self):
+        """
+        Compute every pending value now (e.g. before the state changes)
+        """
+
+        for key in list(self._lazy):
+            self[key]
+
+    def expire(self):
+        """
+        Compute the pending values before the state they read changes
+        """
+
+        self.compute()
+
+    def __getitem__(self, key):
+        if key in self._lazy:
+            self._values[key] = self._lazy.pop(key)()
+        return self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values or key in self._lazy
+
+    def __setitem__(self, key, value):
+        self._lazy.pop(key, None)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        if key in self._lazy:
+            del self._lazy[key]
+        else:
+            del self._values[key]
+
+    def __iter__(self):
+        yield from self._values
+        yield from list(self._lazy)
+
+    def __len__(self):
+        return len(self._values) + len(self._lazy)
+
+    def __repr__(self):
+        return f"LazyDict({self._values}, pending={list(self._lazy)})"
+
+    def __reduce__(self):
+        return dict, (dict(self), )